@@ -77,6 +77,7 @@ from firedrake.optimizer import *
 from firedrake.parameters import *
 from firedrake.parloops import *
 from firedrake.plot import *
+from firedrake.precompile import *
 from firedrake.projection import *
 from firedrake.slate import *
 from firedrake.slope_limiter import *
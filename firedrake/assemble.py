@@ -1,9 +1,15 @@
 import ufl
-from collections import defaultdict
+from collections import OrderedDict, defaultdict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
 from itertools import chain
 import functools
+import loopy
+import numpy
+import weakref
 
 from pyop2 import op2
+from pyop2.datatypes import IntType
+from pyop2.mpi import MPI
 from pyop2.exceptions import MapValueError, SparsityFormatError
 
 from firedrake import assemble_expressions
@@ -20,7 +26,16 @@ from firedrake.utils import ScalarType
 from firedrake.adjoint import annotate_assemble
 
 
-__all__ = ["assemble"]
+__all__ = ["assemble", "assemble_many"]
+
+
+_LoopArgs = namedtuple("_LoopArgs", ["kernel", "integral_type", "iterset",
+                                     "args", "keys", "kwargs"])
+r"""The arguments of a par_loop over the integrals of a form.
+
+``keys`` identifies each of the ``args``, those which are equal are
+the same data accessed through the same map (``None`` for the output
+tensor, which is never shared)."""
 
 
 @annotate_assemble
@@ -75,7 +90,12 @@ def assemble(f, tensor=None, bcs=None, form_compiler_parameters=None,
 
     If ``tensor`` is supplied, the assembled result will be placed
     there, otherwise a new object of the appropriate type will be
-    returned.
+    returned.  Assembling the same form into the same ``tensor`` again
+    (with the same ``bcs`` and parameters) reuses the parallel loops
+    built the first time, which makes repeated assembly of small forms
+    (for example in a time loop) much cheaper.  The loops are rebuilt
+    if the data of a coefficient, the mesh coordinates or the tensor
+    has been replaced.
 
     If ``bcs`` is supplied and ``f`` is a 2-form, the rows and columns
     of the resulting :class:`.Matrix` corresponding to boundary nodes
@@ -98,15 +118,25 @@ def assemble(f, tensor=None, bcs=None, form_compiler_parameters=None,
         raise TypeError("Unknown keyword arguments '%s'" % ', '.join(kwargs.keys()))
 
     if isinstance(f, (ufl.form.Form, slate.TensorBase)):
-        loops = _assemble(f, tensor=tensor, bcs=solving._extract_bcs(bcs),
-                          form_compiler_parameters=form_compiler_parameters,
-                          inverse=inverse, mat_type=mat_type,
-                          sub_mat_type=sub_mat_type, appctx=appctx,
-                          assemble_now=not collect_loops,
-                          allocate_only=allocate_only,
-                          diagonal=diagonal,
-                          options_prefix=options_prefix)
-        loops = tuple(loops)
+        bcs = solving._extract_bcs(bcs)
+        if isinstance(f, ufl.form.Form) and tensor is not None \
+           and not (collect_loops or allocate_only) \
+           and mat_type != "matfree" and not isinstance(tensor, matrix.ImplicitMatrix):
+            for l in _assembly_plan(f, tensor, bcs, form_compiler_parameters,
+                                    inverse, mat_type, sub_mat_type, diagonal,
+                                    assemble_now=True):
+                l()
+            return tensor
+        else:
+            loops = _assemble(f, tensor=tensor, bcs=bcs,
+                              form_compiler_parameters=form_compiler_parameters,
+                              inverse=inverse, mat_type=mat_type,
+                              sub_mat_type=sub_mat_type, appctx=appctx,
+                              assemble_now=not collect_loops,
+                              allocate_only=allocate_only,
+                              diagonal=diagonal,
+                              options_prefix=options_prefix)
+            loops = tuple(loops)
         if collect_loops and not allocate_only:
             # Will this be useful?
             return loops
@@ -121,6 +151,98 @@ def assemble(f, tensor=None, bcs=None, form_compiler_parameters=None,
         raise TypeError("Unable to assemble: %r" % f)
 
 
+class _AssemblyPlan(tuple):
+    r"""The callables which assemble a form into a given tensor.
+
+    Assembling the same form into the same tensor again just calls
+    these, skipping all the checks, kernel lookups and par_loop
+    construction of :func:`_assemble`.  See :func:`_assembly_plan`.
+
+    :arg loops: The callables returned by :func:`_assemble`, without
+        the one returning the result.
+    :arg f: The form.
+    :arg tensor: The tensor it is assembled into.
+    :arg bcs: The boundary conditions.
+    """
+    def __new__(cls, loops, f, tensor, bcs):
+        self = super().__new__(cls, loops)
+        # The par_loops hold on to the data of the coefficients, mesh
+        # coordinates and tensor: if any of these is replaced, the
+        # plan is invalid.  The boundary conditions are kept alive,
+        # since the key refers to them by id.
+        self.data = _AssemblyPlan.data_of(f, tensor)
+        self.bcs = bcs
+        return self
+
+    @staticmethod
+    def key(bcs, form_compiler_parameters, inverse, mat_type, sub_mat_type,
+            diagonal, assemble_now):
+        r"""Return the key of the plan for a form and tensor."""
+        def tuplify(params):
+            return tuple(sorted((params or {}).items()))
+        return (tuple(map(id, bcs)), tuplify(form_compiler_parameters),
+                tuplify(parameters.parameters["form_compiler"]),
+                parameters.parameters["assembly_threads"],
+                inverse, mat_type, sub_mat_type, diagonal, assemble_now)
+
+    @staticmethod
+    def data_of(f, tensor):
+        return (tuple(c.dat for c in f.coefficients())
+                + tuple(m.coordinates.dat for m in f.ufl_domains())
+                + (tensor.M if isinstance(tensor, matrix.MatrixBase) else tensor.dat, ))
+
+    def valid(self, f, tensor):
+        r"""Is this plan still valid for assembling f into tensor?"""
+        return all(a is b for a, b in zip(self.data, _AssemblyPlan.data_of(f, tensor)))
+
+
+def _assembly_plan(f, tensor, bcs, form_compiler_parameters, inverse,
+                   mat_type, sub_mat_type, diagonal, assemble_now):
+    r"""Return the (cached) callables which assemble a form into a tensor.
+
+    :arg f: The form.
+    :arg tensor: The tensor to assemble into.
+    :arg bcs: A tuple of boundary conditions.
+    :arg assemble_now: See :func:`_assemble`.
+    :returns: An :class:`_AssemblyPlan`.
+
+    The remaining arguments are as for :func:`assemble`.
+    """
+    # The plans hold on to the tensor's data, so they live on the
+    # tensor.  UFL forms are not weakly referenceable, so they are
+    # keyed weakly on a token in the form's cache instead: the plans
+    # are dropped when the form dies.
+    token = f._cache.get("firedrake_assembly_plan_token")
+    if token is None:
+        token = f._cache["firedrake_assembly_plan_token"] = _FormToken()
+    try:
+        plans = tensor._assembly_plans
+    except AttributeError:
+        plans = tensor._assembly_plans = weakref.WeakKeyDictionary()
+    plans = plans.setdefault(token, {})
+    key = _AssemblyPlan.key(bcs, form_compiler_parameters, inverse,
+                            mat_type, sub_mat_type, diagonal, assemble_now)
+    plan = plans.get(key)
+    if plan is None or not plan.valid(f, tensor):
+        loops = tuple(_assemble(f, tensor=tensor, bcs=bcs,
+                                form_compiler_parameters=form_compiler_parameters,
+                                inverse=inverse, mat_type=mat_type,
+                                sub_mat_type=sub_mat_type, diagonal=diagonal,
+                                assemble_now=assemble_now))
+        if assemble_now:
+            # The last callable returns the tensor, which assemble
+            # returns itself.  Do not keep it: the plans of a Matrix
+            # then refer only to its PETSc matrix, not to the Matrix
+            # (and so to its form).
+            loops = loops[:-1]
+        plan = plans[key] = _AssemblyPlan(loops, f, tensor, bcs)
+    return plan
+
+
+class _FormToken(object):
+    pass
+
+
 def allocate_matrix(f, bcs=None, form_compiler_parameters=None,
                     inverse=False, mat_type=None, sub_mat_type=None, appctx={},
                     options_prefix=None):
@@ -155,13 +277,53 @@ def create_assembly_callable(f, tensor=None, bcs=None, form_compiler_parameters=
         raise ValueError("Have to provide tensor to write to")
     if mat_type == "matfree":
         return tensor.assemble
-    loops = _assemble(f, tensor=tensor, bcs=bcs,
-                      form_compiler_parameters=form_compiler_parameters,
-                      inverse=inverse, mat_type=mat_type,
-                      sub_mat_type=sub_mat_type,
-                      diagonal=diagonal)
+    if not isinstance(f, ufl.form.Form):
+        loops = tuple(_assemble(f, tensor=tensor, bcs=bcs,
+                                form_compiler_parameters=form_compiler_parameters,
+                                inverse=inverse, mat_type=mat_type,
+                                sub_mat_type=sub_mat_type,
+                                diagonal=diagonal))
+
+        def thunk():
+            for kernel in loops:
+                kernel()
+        return thunk
+    bcs = solving._extract_bcs(bcs)
+    # Build the plan now, and look it up on each call, so that it is
+    # rebuilt if the coefficients are replaced.
+    _assembly_plan(f, tensor, bcs, form_compiler_parameters, inverse,
+                   mat_type, sub_mat_type, diagonal, assemble_now=False)
+
+    def thunk():
+        for kernel in _assembly_plan(f, tensor, bcs, form_compiler_parameters, inverse,
+                                     mat_type, sub_mat_type, diagonal, assemble_now=False):
+            kernel()
+    return thunk
 
-    loops = tuple(loops)
+
+def create_fused_assembly_callable(forms, tensors, bcs=None, form_compiler_parameters=None,
+                                   mat_type=None, sub_mat_type=None):
+    r"""Create a callable object that assembles several forms into
+    tensors, fusing the par_loops of integrals over the same mesh
+    entities so that the mesh, coordinates and shared coefficients are
+    only traversed once.
+
+    :arg forms: The forms to assemble.
+    :arg tensors: The tensors to assemble each form into.
+    :arg bcs: ``None``, or a boundary condition list for each form.
+    :arg form_compiler_parameters: Parameters for the form compiler.
+    :arg mat_type: The matrix type of tensors of bilinear forms (not
+        ``"matfree"``).
+    :arg sub_mat_type: The matrix type of blocks of ``"nest"``
+        matrices.
+
+    As for :func:`create_assembly_callable`, this always assembles
+    into the initially provided tensors.
+    """
+    if mat_type == "matfree":
+        raise ValueError("Cannot fuse matrix-free assembly")
+    loops, _ = _fused_assembly(forms, tensors, bcs, form_compiler_parameters,
+                               mat_type, sub_mat_type, assemble_now=False)
 
     def thunk():
         for kernel in loops:
@@ -169,6 +331,323 @@ def create_assembly_callable(f, tensor=None, bcs=None, form_compiler_parameters=
     return thunk
 
 
+def assemble_many(forms, tensors=None, bcs=None, form_compiler_parameters=None,
+                  mat_type=None, sub_mat_type=None):
+    r"""Assemble several forms at once.
+
+    Integrals of the forms over the same mesh entities are assembled
+    in a single par_loop, whose kernel evaluates all of them (see
+    :func:`create_fused_assembly_callable`), so the mesh data and
+    shared coefficients are only gathered once, rather than once per
+    form.
+
+    :arg forms: The :class:`~ufl.classes.Form`\s (or Slate tensors) to
+        assemble.
+    :arg tensors: ``None``, or a list with an existing tensor (or
+        ``None``) for each form to place the result in.
+    :arg bcs: ``None``, or a list with the boundary conditions (or
+        ``None``) for each form.
+    :arg form_compiler_parameters: (optional) dict of parameters to
+        pass to the form compiler.
+    :arg mat_type: (optional) the type of assembled matrices, see
+        :func:`assemble`.
+    :arg sub_mat_type: (optional) the type of blocks of ``"nest"``
+        matrices, see :func:`assemble`.
+    :returns: A list of the results, as :func:`assemble` would return
+        them for each form.
+    """
+    forms = tuple(forms)
+    if tensors is None:
+        tensors = [None for _ in forms]
+    if bcs is None:
+        bcs = [None for _ in forms]
+    if not len(forms) == len(tensors) == len(bcs):
+        raise ValueError("Need as many tensors and bcs as forms")
+    for f in forms:
+        if not isinstance(f, (ufl.form.Form, slate.TensorBase)):
+            raise TypeError("Unable to assemble: %r" % f)
+    loops, results = _fused_assembly(forms, tensors, [solving._extract_bcs(b) for b in bcs],
+                                     form_compiler_parameters, mat_type, sub_mat_type,
+                                     assemble_now=True)
+    for loop in loops:
+        loop()
+    return [result() for result in results]
+
+
+def _fused_assembly(forms, tensors, bcs, form_compiler_parameters,
+                    mat_type, sub_mat_type, assemble_now):
+    r"""Build the callables which assemble several forms with fused
+    par_loops.
+
+    :returns: A tuple ``(loops, results)`` of the callables to run, in
+        order, and if ``assemble_now``, the callables returning the
+        result of each form.
+    """
+    if bcs is None:
+        bcs = [None for _ in forms]
+    before = []
+    loops = []
+    after = []
+    results = []
+    for f, tensor, bcs_ in zip(forms, tensors, bcs):
+        items = list(_assemble(f, tensor=tensor, bcs=bcs_,
+                               form_compiler_parameters=form_compiler_parameters,
+                               mat_type=mat_type, sub_mat_type=sub_mat_type,
+                               assemble_now=assemble_now, loop_args=True))
+        if assemble_now:
+            results.append(items.pop())
+        indices = [i for i, item in enumerate(items) if isinstance(item, _LoopArgs)]
+        start, stop = (indices[0], indices[-1] + 1) if indices else (len(items), len(items))
+        # Zeroing the tensors happens before any loop, boundary
+        # conditions and matrix assembly after them all.
+        before.extend(items[:start])
+        loops.extend(items[start:stop])
+        after.extend(items[stop:])
+    return tuple(chain(before, _fuse_loops(loops), after)), results
+
+
+def _fuse_loops(loops):
+    r"""Fuse par_loops over the same iteration set.
+
+    :arg loops: An iterable of :class:`_LoopArgs`.
+    :returns: A list of par_loop callables, one for each iteration set.
+    """
+    groups = OrderedDict()
+    for loop in loops:
+        key = (loop.integral_type, id(loop.iterset), tuple(sorted(loop.kwargs.items())))
+        groups.setdefault(key, []).append(loop)
+    parloops = []
+    for group in groups.values():
+        fused = None
+        if len(group) > 1 and all(isinstance(loop.kernel.code, loopy.LoopKernel) for loop in group):
+            fused = _fused_loop(group)
+        if fused is None:
+            parloops.extend(op2.ParLoop(loop.kernel, loop.iterset, *loop.args, **loop.kwargs).compute
+                            for loop in group)
+        else:
+            parloops.append(fused)
+    return parloops
+
+
+_fused_kernels = {}
+r"""Cache of fused kernels, keyed on the cache keys of the kernels
+they are made from and the pattern of shared arguments."""
+
+
+def _fused_loop(loops):
+    r"""Fuse the kernels of par_loops over the same iteration set into
+    one, which is passed the arguments the loops share only once.
+
+    :arg loops: A list of :class:`_LoopArgs` with loopy kernels.
+    :returns: The fused par_loop's callable, or ``None`` if the
+        kernels could not be fused.
+    """
+    numbers = {}
+    args = []
+    pattern = []
+    for loop in loops:
+        indices = []
+        for arg, key in zip(loop.args, loop.keys):
+            if key is None or key not in numbers:
+                if key is not None:
+                    numbers[key] = len(args)
+                indices.append(len(args))
+                args.append(arg)
+            else:
+                indices.append(numbers[key])
+        pattern.append(tuple(indices))
+    cache_key = (tuple(loop.kernel.cache_key for loop in loops), tuple(pattern))
+    try:
+        kernel = _fused_kernels[cache_key]
+    except KeyError:
+        knls = []
+        for loop, indices in zip(loops, pattern):
+            knl = loop.kernel.code
+            for karg, i in zip(knl.args, indices):
+                knl = loopy.rename_argument(knl, karg.name, "fused_arg%d" % i)
+            knls.append(knl)
+        try:
+            knl = loopy.fuse_kernels(knls)
+        except loopy.LoopyError:
+            kernel = None
+        else:
+            knl = knl.copy(name="fused_%s" % "_".join(k.name for k in knls),
+                           args=[knl.arg_dict["fused_arg%d" % i] for i in range(len(args))])
+            kernel = op2.Kernel(knl, knl.name)
+        kernel = _fused_kernels.setdefault(cache_key, kernel)
+    if kernel is None:
+        return None
+    loop = loops[0]
+    try:
+        return op2.ParLoop(kernel, loop.iterset, *args, **loop.kwargs).compute
+    except MapValueError:
+        raise RuntimeError("Integral measure does not match measure of all coefficients/arguments")
+
+
+def _colour(values):
+    r"""Colour entities so that no two of the same colour share a value.
+
+    :arg values: An array of shape ``(nentities, arity)`` of the values
+        (e.g. dofs) each entity touches.  Negative values are ignored.
+    :returns: The colour of each entity, numbered from 0.
+
+    This is a Jones-Plassmann colouring: each round, the entities with
+    the largest (random) weight among the uncoloured entities at each
+    of their values take the smallest colour not yet used at any of
+    their values.
+    """
+    nentities = len(values)
+    colours = numpy.full(nentities, -1, dtype=IntType)
+    weights = numpy.random.RandomState(0).permutation(nentities)
+    valid = values >= 0
+    nvalues = values.max() + 1 if values.size else 0
+    best = numpy.empty(nvalues, dtype=weights.dtype)
+    # Bitmasks of the colours used at each value, 64 colours per word.
+    used = []
+    uncoloured = numpy.arange(nentities)
+    while len(uncoloured):
+        vals = values[uncoloured]
+        mask = valid[uncoloured]
+        w = numpy.broadcast_to(weights[uncoloured, numpy.newaxis], vals.shape)
+        best.fill(-1)
+        numpy.maximum.at(best, vals[mask], w[mask])
+        selected = numpy.all(~mask | (best[vals] == w), axis=1)
+        entities = uncoloured[selected]
+        uncoloured = uncoloured[~selected]
+
+        # The selected entities share no values, so can be coloured
+        # at once.
+        vals = values[entities]
+        mask = valid[entities]
+        colour = numpy.full(len(entities), -1, dtype=IntType)
+        word = 0
+        while (colour < 0).any():
+            if word == len(used):
+                used.append(numpy.zeros(nvalues, dtype=numpy.uint64))
+            bits = used[word]
+            free = ~numpy.bitwise_or.reduce(numpy.where(mask, bits[vals], numpy.uint64(0)),
+                                            axis=1)
+            todo = (colour < 0) & (free != 0)
+            lowest = free[todo] & (~free[todo] + numpy.uint64(1))
+            colour[todo] = 64*word + numpy.log2(lowest).astype(IntType)
+            bit = numpy.broadcast_to(
+                (numpy.uint64(1) << (colour[todo] - 64*word).astype(numpy.uint64))[:, numpy.newaxis],
+                vals[todo].shape)
+            numpy.bitwise_or.at(bits, vals[todo][mask[todo]], bit[mask[todo]])
+            word += 1
+        colours[entities] = colour
+    return colours
+
+
+def _colour_subsets(mesh, iterset, map_):
+    r"""Split an iteration set into subsets whose entities share no
+    values of a map.
+
+    :arg mesh: The mesh, on which the subsets are cached.
+    :arg iterset: The :class:`pyop2.Set` (or :class:`pyop2.Subset`) to
+        split.
+    :arg map_: The :class:`pyop2.Map` from ``iterset``.
+    :returns: A tuple of :class:`pyop2.Subset`\s, one for each colour.
+        The number of colours is the same on every process.
+    """
+    cache = mesh.topology.__dict__.setdefault("_colour_subsets_cache", {})
+    key = (id(iterset), id(map_))
+    try:
+        iterset_, map__, subsets = cache[key]
+        if iterset_ is iterset and map__ is map_:
+            return subsets
+    except KeyError:
+        pass
+    if isinstance(iterset, op2.Subset):
+        superset = iterset.superset
+        entities = iterset.indices
+    else:
+        superset = iterset
+        entities = numpy.arange(iterset.total_size, dtype=IntType)
+    colours = _colour(map_.values_with_halo[entities])
+    ncolours = mesh.comm.allreduce(colours.max() + 1 if len(colours) else 0, op=MPI.MAX)
+    subsets = tuple(op2.Subset(superset, entities[colours == c])
+                    for c in range(ncolours))
+    # Keep the set and map alive, so that the key stays valid.
+    cache[key] = (iterset, map_, subsets)
+    return subsets
+
+
+class _ThreadedJITModule(object):
+    r"""Calls a compiled par_loop over chunks of its iteration range on
+    several threads.
+
+    The generated code is called through ctypes, which releases the
+    GIL, so the chunks run concurrently.  The caller must ensure that
+    the entities of different chunks do not race.
+
+    :arg jitmodule: The :class:`pyop2.sequential.JITModule` to call.
+    :arg nthreads: The number of threads.
+    """
+    def __init__(self, jitmodule, nthreads):
+        self.jitmodule = jitmodule
+        self.nthreads = nthreads
+
+    def __getattr__(self, name):
+        return getattr(self.jitmodule, name)
+
+    def __call__(self, start, end, *arglist):
+        chunks = numpy.linspace(start, end, self.nthreads + 1).astype(int)
+        chunks = list(zip(chunks[:-1], chunks[1:]))
+        if not hasattr(self.jitmodule, "_fun"):
+            # The first call compiles (collectively), so is not
+            # threaded.  The compiled function lives on the (cached)
+            # JITModule, so other wrappers of it see it too.
+            self.jitmodule(*chunks.pop(0), *arglist)
+        pool = _thread_pool(self.nthreads)
+        futures = [pool.submit(self.jitmodule, a, b, *arglist)
+                   for a, b in chunks if b > a]
+        for future in futures:
+            future.result()
+
+
+@functools.lru_cache(maxsize=None)
+def _thread_pool(nthreads):
+    return ThreadPoolExecutor(max_workers=nthreads)
+
+
+class _ColouredParLoop(object):
+    r"""A par_loop which increments a :class:`pyop2.Dat` using several
+    threads.
+
+    The iteration set is coloured so that entities of the same colour
+    increment disjoint entries of the output, and each colour is a
+    par_loop whose iterations are split between the threads.  Halo
+    exchanges are done by the par_loops as usual.
+
+    :arg mesh: The mesh.
+    :arg kernel: The :class:`pyop2.Kernel`.
+    :arg iterset: The iteration set.
+    :arg args: The par_loop arguments, the first of which is the output.
+    :arg kwargs: The par_loop keyword arguments.
+    :arg map_: The map of the output argument.
+    :arg nthreads: The number of threads.
+    """
+    def __init__(self, mesh, kernel, iterset, args, kwargs, map_, nthreads):
+        self.loops = []
+        for subset in _colour_subsets(mesh, iterset, map_):
+            loop = op2.ParLoop(kernel, subset, *args, **kwargs)
+            loop._jitmodule = _ThreadedJITModule(loop._jitmodule, nthreads)
+            self.loops.append(loop)
+        if not self.loops:
+            # Nothing to iterate over anywhere.
+            self.loops.append(op2.ParLoop(kernel, iterset, *args, **kwargs))
+
+    @property
+    def _jitmodule(self):
+        # All the colours share the generated code.
+        return self.loops[0]._jitmodule
+
+    def compute(self):
+        for loop in self.loops:
+            loop.compute()
+
+
 @utils.known_pyop2_safe
 def _assemble(f, tensor=None, bcs=None, form_compiler_parameters=None,
               inverse=False, mat_type=None, sub_mat_type=None,
@@ -177,7 +656,8 @@ def _assemble(f, tensor=None, bcs=None, form_compiler_parameters=None,
               assemble_now=False,
               allocate_only=False,
               zero_tensor=True,
-              diagonal=False):
+              diagonal=False,
+              loop_args=False):
     r"""Assemble the form or Slate expression f and return a Firedrake object
     representing the result. This will be a :class:`float` for 0-forms/rank-0
     Slate tensors, a :class:`.Function` for 1-forms/rank-1 Slate tensors and
@@ -199,6 +679,10 @@ def _assemble(f, tensor=None, bcs=None, form_compiler_parameters=None,
          matrix if an implicit matrix is requested (mat_type "matfree").
     :arg options_prefix: An options prefix for the PETSc matrix
         (ignored if not assembling a bilinear form).
+    :arg loop_args: If ``True``, yield a :class:`_LoopArgs` describing
+        each par_loop over the integrals, rather than the par_loop
+        itself, so that it may be fused with others (see
+        :func:`_fuse_loops`).
     """
     if mat_type is None:
         mat_type = parameters.parameters["default_matrix_type"]
@@ -285,9 +769,9 @@ def _assemble(f, tensor=None, bcs=None, form_compiler_parameters=None,
         test, trial = f.arguments()
 
         map_pairs = []
-        cell_domains = []
-        exterior_facet_domains = []
-        interior_facet_domains = []
+        cell_domains = set()
+        exterior_facet_domains = set()
+        interior_facet_domains = set()
         if tensor is None:
             # For horizontal facets of extruded meshes, the corresponding domain
             # in the base mesh is the cell domain. Hence all the maps used for top
@@ -296,35 +780,41 @@ def _assemble(f, tensor=None, bcs=None, form_compiler_parameters=None,
             # computation.
             for integral_type in integral_types:
                 if integral_type == "cell":
-                    cell_domains.append(op2.ALL)
+                    cell_domains.add(op2.ALL)
                 elif integral_type == "exterior_facet":
-                    exterior_facet_domains.append(op2.ALL)
+                    exterior_facet_domains.add(op2.ALL)
                 elif integral_type == "interior_facet":
-                    interior_facet_domains.append(op2.ALL)
+                    interior_facet_domains.add(op2.ALL)
                 elif integral_type == "exterior_facet_bottom":
-                    cell_domains.append(op2.ON_BOTTOM)
+                    cell_domains.add(op2.ON_BOTTOM)
                 elif integral_type == "exterior_facet_top":
-                    cell_domains.append(op2.ON_TOP)
+                    cell_domains.add(op2.ON_TOP)
                 elif integral_type == "exterior_facet_vert":
-                    exterior_facet_domains.append(op2.ALL)
+                    exterior_facet_domains.add(op2.ALL)
                 elif integral_type == "interior_facet_horiz":
-                    cell_domains.append(op2.ON_INTERIOR_FACETS)
+                    cell_domains.add(op2.ON_INTERIOR_FACETS)
                 elif integral_type == "interior_facet_vert":
-                    interior_facet_domains.append(op2.ALL)
+                    interior_facet_domains.add(op2.ALL)
                 else:
                     raise ValueError('Unknown integral type "%s"' % integral_type)
 
-            # Used for the sparsity construction
+            # Used for the sparsity construction.  Sparsities are cached
+            # on the dof sets, keyed on the maps, iteration regions and
+            # nest and block flags, so matrices on the same spaces with
+            # the same integral types (e.g. mass and stiffness matrices)
+            # share one.  The iteration regions are therefore made
+            # unique and sorted, so that forms with several integrals of
+            # a type get the same key as those with one.
             iteration_regions = []
             if cell_domains:
                 map_pairs.append((test.cell_node_map(), trial.cell_node_map()))
-                iteration_regions.append(tuple(cell_domains))
+                iteration_regions.append(tuple(sorted(cell_domains)))
             if exterior_facet_domains:
                 map_pairs.append((test.exterior_facet_node_map(), trial.exterior_facet_node_map()))
-                iteration_regions.append(tuple(exterior_facet_domains))
+                iteration_regions.append(tuple(sorted(exterior_facet_domains)))
             if interior_facet_domains:
                 map_pairs.append((test.interior_facet_node_map(), trial.interior_facet_node_map()))
-                iteration_regions.append(tuple(interior_facet_domains))
+                iteration_regions.append(tuple(sorted(interior_facet_domains)))
 
             map_pairs = tuple(map_pairs)
             # Construct OP2 Mat to assemble into
@@ -416,6 +906,7 @@ def _assemble(f, tensor=None, bcs=None, form_compiler_parameters=None,
     # boundary conditions provided are the ones we want.  It therefore
     # is only used inside residual and jacobian assembly.
 
+    nthreads = parameters.parameters["assembly_threads"]
     if zero_tensor:
         yield zero_tensor_parloop
     for indices, kinfo in kernels:
@@ -463,6 +954,7 @@ def _assemble(f, tensor=None, bcs=None, form_compiler_parameters=None,
         # Some integrals require non-coefficient arguments at the
         # end (facet number information).
         extra_args = []
+        extra_keys = []
         # Decoration for applying to matrix maps in extruded case
         decoration = None
         itspace = m.measure_set(integral_type, subdomain_id,
@@ -477,6 +969,7 @@ def _assemble(f, tensor=None, bcs=None, form_compiler_parameters=None,
 
         elif integral_type in ("exterior_facet", "exterior_facet_vert"):
             extra_args.append(m.exterior_facets.local_facet_dat(op2.READ))
+            extra_keys.append((id(m.exterior_facets.local_facet_dat), None))
 
             def get_map(x):
                 return x.exterior_facet_node_map()
@@ -494,6 +987,7 @@ def _assemble(f, tensor=None, bcs=None, form_compiler_parameters=None,
 
         elif integral_type in ("interior_facet", "interior_facet_vert"):
             extra_args.append(m.interior_facets.local_facet_dat(op2.READ))
+            extra_keys.append((id(m.interior_facets.local_facet_dat), None))
 
             def get_map(x):
                 return x.interior_facet_node_map()
@@ -520,28 +1014,45 @@ def _assemble(f, tensor=None, bcs=None, form_compiler_parameters=None,
             tensor_arg = tensor(op2.INC)
 
         coords = m.coordinates
-        args = [kernel, itspace, tensor_arg,
-                coords.dat(op2.READ, get_map(coords))]
+        args = [tensor_arg, coords.dat(op2.READ, get_map(coords))]
+        # Identify the arguments, so that those shared with other
+        # par_loops can be passed once when fusing them.
+        keys = [None, (id(coords.dat), id(get_map(coords)))]
         if needs_orientations:
             o = m.cell_orientations()
             args.append(o.dat(op2.READ, get_map(o)))
+            keys.append((id(o.dat), id(get_map(o))))
         if needs_cell_sizes:
             o = m.cell_sizes
             args.append(o.dat(op2.READ, get_map(o)))
+            keys.append((id(o.dat), id(get_map(o))))
 
         for n in coeff_map:
             c = coefficients[n]
             for c_ in c.split():
                 m_ = get_map(c_)
                 args.append(c_.dat(op2.READ, m_))
+                keys.append((id(c_.dat), id(m_)))
         if needs_cell_facets:
             assert integral_type == "cell"
             extra_args.append(m.cell_to_facets(op2.READ))
+            extra_keys.append((id(m.cell_to_facets), None))
 
         args.extend(extra_args)
+        keys.extend(extra_keys)
         kwargs["pass_layer_arg"] = pass_layer_arg
+        if loop_args:
+            yield _LoopArgs(kernel, integral_type, itspace, args, keys, kwargs)
+            continue
         try:
-            yield op2.ParLoop(*args, **kwargs).compute
+            if nthreads > 1 and is_vec and get_map(test.function_space()[i]):
+                # Matrix insertion in PETSc is not thread safe, and all
+                # entities increment a 0-form, so only vectors are
+                # assembled with threads.
+                yield _ColouredParLoop(m, kernel, itspace, args, kwargs,
+                                       get_map(test.function_space()[i]), nthreads).compute
+            else:
+                yield op2.ParLoop(kernel, itspace, *args, **kwargs).compute
         except MapValueError:
             raise RuntimeError("Integral measure does not match measure of all coefficients/arguments")
 
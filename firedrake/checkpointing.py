@@ -1,9 +1,16 @@
 from firedrake.petsc import PETSc
-from pyop2.mpi import COMM_WORLD, dup_comm, free_comm
+from pyop2.mpi import COMM_WORLD, MPI, dup_comm, free_comm
+from pyop2.datatypes import IntType, ScalarType
 from firedrake.cython import hdf5interface as h5i
+from firedrake.output import _BackgroundWriter, is_dg
+from tsfc.fiatinterface import create_element
 import firedrake
+import FIAT
+import ufl
+import hashlib
 import numpy as np
 import os
+import weakref
 import h5py
 
 
@@ -20,6 +27,113 @@ FILE_UPDATE = PETSc.Viewer.Mode.APPEND
 r"""Open a checkpoint file for updating.  Creates the file if it does not exist, providing both read and write access."""
 
 
+def _redistributable(V):
+    r"""Can :class:`~.Function`\s on V be reloaded on a different
+    number of processes?
+
+    This requires that every node can be identified by a position
+    (which is true for point evaluation elements) on a non-extruded
+    mesh.
+
+    :arg V: A FunctionSpace.
+    """
+    element = V.ufl_element()
+    if len(V) > 1 or element.family() == "Real" or V.mesh().cell_set._extruded:
+        return False
+    if isinstance(element, (ufl.VectorElement, ufl.TensorElement)):
+        element = element.sub_elements()[0]
+    return all(isinstance(dual, FIAT.functional.PointEvaluation)
+               for dual in create_element(element, vector_is_mixed=False).dual_basis())
+
+
+def _node_keys(V):
+    r"""Return keys identifying the owned nodes of a function space
+    independently of the mesh distribution.
+
+    The key of a node is its position, followed, for fully
+    discontinuous spaces (in which nodes of neighbouring cells may
+    coincide), by the barycentre of the cell it belongs to.
+
+    :arg V: A FunctionSpace (see :func:`_redistributable`).
+    :returns: An array of shape ``(nowned, key_size)``.
+    """
+    mesh = V.mesh()
+    element = V.ufl_element()
+    if isinstance(element, (ufl.VectorElement, ufl.TensorElement)):
+        element = element.sub_elements()[0]
+    X = firedrake.Function(firedrake.VectorFunctionSpace(mesh, element))
+    X.interpolate(firedrake.SpatialCoordinate(mesh))
+    keys = X.dat.data_ro.real.reshape(-1, mesh.geometric_dimension())
+    if is_dg(V):
+        coordinates = mesh.coordinates
+        cell_nodes = coordinates.cell_node_map().values_with_halo
+        barycentres = coordinates.dat.data_ro_with_halos.real[cell_nodes].mean(axis=1)
+        node_cell = np.empty(V.node_set.total_size, dtype=IntType)
+        node_cell[V.cell_node_map().values_with_halo] = np.arange(len(cell_nodes), dtype=IntType)[:, None]
+        keys = np.hstack([keys, barycentres[node_cell[:len(keys)]]])
+    return keys
+
+
+def _quantise(keys, resolution):
+    return np.rint(np.asarray(keys) / resolution).astype(np.int64)
+
+
+def _directory_rank(keys, size):
+    r"""Hash integer keys (rows of an array) to ranks."""
+    h = np.zeros(len(keys), dtype=np.uint64)
+    for column in keys.T:
+        h = h * np.uint64(1000003) ^ column.astype(np.uint64)
+    return (h % np.uint64(size)).astype(np.intc)
+
+
+def _exchange(comm, keys, payload):
+    r"""Send rows of (keys, payload) to their directory rank.
+
+    :returns: a tuple ``(order, sendcounts, recvcounts, received)``
+        where ``order`` is the permutation applied to the sent rows.
+    """
+    dest = _directory_rank(keys, comm.size)
+    order = np.argsort(dest, kind="stable")
+    sendcounts = np.bincount(dest, minlength=comm.size).astype(np.intc)
+    recvcounts = np.empty_like(sendcounts)
+    comm.Alltoall(sendcounts, recvcounts)
+    received = firedrake.function._alltoallv(comm, np.hstack([keys, payload])[order], sendcounts, recvcounts)
+    return order, sendcounts, recvcounts, received
+
+
+def _match_rows(comm, stored, offset, wanted):
+    r"""Find the stored rows matching some keys, using a distributed
+    directory so that no process ever sees more than its share of
+    the keys.
+
+    :arg comm: The communicator.
+    :arg stored: The (quantised) keys of the stored rows read on this
+        process.
+    :arg offset: The global index of the first row in ``stored``.
+    :arg wanted: The (quantised) keys to look up.
+    :returns: The global row index for each wanted key, or -1 if the
+        key was not found.
+    """
+    void = np.dtype((np.void, stored.dtype.itemsize * stored.shape[1]))
+    rows = np.arange(offset, offset + len(stored), dtype=np.int64).reshape(-1, 1)
+    *_, directory = _exchange(comm, stored, rows)
+    # Ask the directory
+    order, sendcounts, recvcounts, requests = _exchange(comm, wanted, np.empty((len(wanted), 0), dtype=np.int64))
+
+    directory_keys = np.ascontiguousarray(directory[:, :-1]).view(void).ravel()
+    request_keys = np.ascontiguousarray(requests).view(void).ravel()
+    found = np.full(len(request_keys), -1, dtype=np.int64)
+    if len(directory_keys) > 0:
+        perm = np.argsort(directory_keys)
+        idx = np.minimum(np.searchsorted(directory_keys[perm], request_keys), len(perm) - 1)
+        hit = directory_keys[perm[idx]] == request_keys
+        found[hit] = directory[perm[idx[hit]], -1]
+    # And send the answers back.
+    result = np.empty(len(wanted), dtype=np.int64)
+    result[order] = firedrake.function._alltoallv(comm, found, recvcounts, sendcounts)
+    return result
+
+
 class DumbCheckpoint(object):
 
     r"""A very dumb checkpoint object.
@@ -37,6 +151,13 @@ class DumbCheckpoint(object):
          :data:`~.FILE_CREATE`, or :data:`~.FILE_UPDATE`)
     :arg comm: (optional) communicator the writes should be collective
          over.
+    :arg incremental: If ``True``, :meth:`store` does not write the
+         values of a function which are identical to those it last
+         stored under the same name in the current file: it instead
+         stores a link to the existing data.  This makes on-disk size
+         and write time proportional to what actually changed, for
+         time series in which some fields (such as parameters and
+         static coefficients) rarely change.
 
     This object can be used in a context manager (in which case it
     closes the file when the scope is exited).
@@ -50,17 +171,26 @@ class DumbCheckpoint(object):
        breakages.
 
     """
+
+    _timestep_chunk_size = 1024
+    r"""The chunk size of the datasets indexing the stored timesteps."""
+
     def __init__(self, basename, single_file=True,
-                 mode=FILE_UPDATE, comm=None):
+                 mode=FILE_UPDATE, comm=None, incremental=False):
         self.comm = dup_comm(comm or COMM_WORLD)
         self.mode = mode
 
+        self._incremental = incremental
+        # Map from stored names to the path and (local) digest of the
+        # values last stored in the current file.
+        self._stored = {}
         self._single = single_file
         self._made_file = False
         self._basename = basename
         self._time = None
         self._tidx = -1
         self._fidx = 0
+        self._timestep_lookup = None
         self.new_file()
 
     def set_timestep(self, t, idx=None):
@@ -78,12 +208,32 @@ class DumbCheckpoint(object):
         self._time = t
         if self.mode == FILE_READ:
             return
-        indices = self.read_attribute("/", "stored_time_indices", [])
-        new_indices = np.concatenate((indices, [self._tidx]))
-        self.write_attribute("/", "stored_time_indices", new_indices)
-        steps = self.read_attribute("/", "stored_time_steps", [])
-        new_steps = np.concatenate((steps, [self._time]))
-        self.write_attribute("/", "stored_time_steps", new_steps)
+        self._append_timestep(self._time, self._tidx)
+
+    def _append_timestep(self, t, idx):
+        r"""Record a timestep in the index of the current file.
+
+        The index is stored in two extendable datasets, so that
+        appending to it does not rewrite it.  Files written by older
+        versions stored it in attributes of the root group, these are
+        converted on the first append."""
+        h5file = self.h5file
+        if "stored_time_indices" not in h5file:
+            indices = self.read_attribute("/", "stored_time_indices", [])
+            steps = self.read_attribute("/", "stored_time_steps", [])
+            for name, data in (("stored_time_indices", np.asarray(indices, dtype=np.int64)),
+                               ("stored_time_steps", np.asarray(steps, dtype=np.float64))):
+                h5file.create_dataset(name, data=data, maxshape=(None, ),
+                                      chunks=(self._timestep_chunk_size, ))
+                if name in h5file.attrs:
+                    del h5file.attrs[name]
+        for name, val in (("stored_time_indices", idx), ("stored_time_steps", t)):
+            dset = h5file[name]
+            n, = dset.shape
+            dset.resize((n + 1, ))
+            dset[n] = val
+        if self._timestep_lookup is not None:
+            self._timestep_lookup.setdefault(t, idx)
 
     def get_timesteps(self):
         r"""Return all the time steps (and time indices) in the current
@@ -92,10 +242,34 @@ class DumbCheckpoint(object):
         This is useful when reloading from a checkpoint file that
         contains multiple timesteps and one wishes to determine the
         final available timestep in the file."""
+        h5file = self.h5file
+        if "stored_time_indices" in h5file:
+            return h5file["stored_time_steps"][:], h5file["stored_time_indices"][:]
         indices = self.read_attribute("/", "stored_time_indices", [])
         steps = self.read_attribute("/", "stored_time_steps", [])
         return steps, indices
 
+    def get_timestep_index(self, t):
+        r"""Return the index of the (first) timestep stored with value ``t``.
+
+        :arg t: The timestep value.
+
+        Raises :exc:`KeyError` if no such timestep is stored in the
+        current file.  To read the data stored at time ``t``, use::
+
+            chk.set_timestep(t, idx=chk.get_timestep_index(t))
+        """
+        if self._timestep_lookup is None:
+            steps, indices = self.get_timesteps()
+            lookup = {}
+            for step, index in zip(steps, indices):
+                lookup.setdefault(step, int(index))
+            self._timestep_lookup = lookup
+        try:
+            return self._timestep_lookup[t]
+        except KeyError:
+            raise KeyError("No timestep %s stored" % t)
+
     def new_file(self, name=None):
         r"""Open a new on-disk file for writing checkpoint data.
 
@@ -167,6 +341,8 @@ class DumbCheckpoint(object):
 
     def close(self):
         r"""Close the checkpoint file (flushing any pending writes)"""
+        self._timestep_lookup = None
+        self._stored = {}
         if hasattr(self, "_vwr"):
             self._vwr.destroy()
             del self._vwr
@@ -208,6 +384,8 @@ class DumbCheckpoint(object):
         group = self._get_data_group()
         self._write_timestep_attr(group)
         with function.dat.vec_ro as v:
+            if self._incremental and self._store_link(v, group, name):
+                return
             self.vwr.pushGroup(group)
             oname = v.getName()
             v.setName(name)
@@ -215,6 +393,32 @@ class DumbCheckpoint(object):
             v.setName(oname)
             self.vwr.popGroup()
 
+    def _store_link(self, v, group, name):
+        r"""Store a link to the values last stored under ``name``, if
+        they are unchanged.
+
+        :arg v: The Vec to store.
+        :arg group: The group to store it in.
+        :arg name: The name to store it under.
+        :returns: ``True`` if a link was stored, ``False`` if the
+            values must be written.
+        """
+        path = "%s/%s" % (group, name)
+        digest = (v.getSize(), hashlib.sha1(v.array_r.tobytes()).digest())
+        previous, stored = self._stored.get(name, (None, None))
+        self._stored[name] = (path, digest)
+        unchanged = self.comm.allreduce(digest == stored, op=MPI.LAND)
+        if unchanged and previous == path:
+            return True
+        h5file = self.h5file
+        if path in h5file:
+            # Never write through a link into previously stored data.
+            del h5file[path]
+        if unchanged:
+            h5file.require_group(group)
+            h5file[path] = h5file[previous]
+        return unchanged
+
     def load(self, function, name=None):
         r"""Store a function from the checkpoint file.
 
@@ -299,20 +503,49 @@ class HDF5File(object):
     r"""An object to facilitate checkpointing.
 
     This checkpoint object is capable of writing :class:`~.Function`\s
-    to disk in parallel (using HDF5) and reloading them on the same
-    number of processes and a :func:`~.Mesh` constructed identically.
+    to disk in parallel (using HDF5) and reloading them on a
+    :func:`~.Mesh` constructed identically.  Functions in spaces
+    whose nodes are point evaluations (for example Lagrange and
+    discontinuous Lagrange spaces, including vector and tensor
+    valued ones) are stored along with keys identifying their nodes,
+    so that they can be reloaded on any number of processes.  Other
+    functions can only be reloaded on the same number of processes.
 
     :arg filename: filename (including suffix .h5) of checkpoint file.
     :arg file_mode: the access mode, passed directly to h5py, see
         :class:`h5py:File` for details on the meaning.
     :arg comm: communicator the writes should be collective
          over.
+    :arg asynchronous: If ``True``, :meth:`write` only takes a copy
+        of the function's values: the data is written to disk by a
+        background thread, overlapping with subsequent computation.
+        Call :meth:`wait` to wait for the writes to complete (this is
+        done automatically before reading, and when closing the file).
+        In parallel, this requires that MPI was initialised with
+        ``MPI_THREAD_MULTIPLE``.
+    :arg max_pending_writes: The maximum number of writes waiting to
+        be performed in asynchronous mode; beyond that :meth:`write`
+        blocks until a write has finished.  Each function keeps a
+        buffer per pending write, so the default of 2 double-buffers
+        its values.
+    :arg compression: Compression filter for the stored data, one of
+        ``None``, ``"gzip"`` or ``"lzf"`` (the latter is only
+        available with h5py).
+    :arg compression_opts: Filter options, for ``"gzip"`` the
+        compression level (0-9).
+    :arg shuffle: Apply the byte shuffle filter before compressing,
+        which usually improves the compression ratio of floating point
+        data.
+    :arg chunks: The length of the chunks datasets are stored in,
+        ``None`` to choose automatically.  Filtered datasets are
+        always chunked.
 
     This object can be used in a context manager (in which case it
     closes the file when the scope is exited).
 
     """
-    def __init__(self, filename, file_mode, comm=None):
+    def __init__(self, filename, file_mode, comm=None, asynchronous=False, max_pending_writes=2,
+                 compression=None, compression_opts=None, shuffle=False, chunks=None):
         self.comm = dup_comm(comm or COMM_WORLD)
 
         self._filename = filename
@@ -322,6 +555,29 @@ class HDF5File(object):
         if file_mode == 'r' and not exists:
             raise IOError("File '%s' does not exist, cannot be opened for reading" % filename)
 
+        if compression not in {None, "gzip", "lzf"}:
+            raise ValueError("Unknown compression '%s', expecting None, 'gzip' or 'lzf'" % compression)
+        if compression is not None and self.comm.size > 1 \
+           and h5py.version.hdf5_version_tuple < (1, 10, 2):
+            raise ValueError("Compressed parallel writes need HDF5 1.10.2 or later")
+        self._create_args = {}
+        if compression is not None:
+            self._create_args.update(compression=compression, compression_opts=compression_opts)
+        if shuffle:
+            self._create_args["shuffle"] = True
+        self._chunks = chunks
+
+        if asynchronous:
+            if self.comm.size > 1 and MPI.Query_thread() < MPI.THREAD_MULTIPLE:
+                raise ValueError("Asynchronous parallel writes need MPI initialised with MPI_THREAD_MULTIPLE")
+            self._writer = _BackgroundWriter(max_pending_writes)
+        else:
+            self._writer = None
+        # Buffers holding the values of pending asynchronous writes,
+        # once written they are reused for the next write of the
+        # same function.
+        self._buffers = weakref.WeakKeyDictionary()
+
         # Create the directory if necessary
         dirname = os.path.dirname(filename)
         try:
@@ -335,13 +591,11 @@ class HDF5File(object):
         except NameError:  # the error you get if h5py isn't compiled against parallel HDF5
             raise RuntimeError("h5py *must* be installed with MPI support")
 
-        if file_mode == 'r':
-            nprocs = self.attributes('/')['nprocs']
-            if nprocs != self.comm.size:
-                raise ValueError("Process mismatch: written on %d, have %d" %
-                                 (nprocs, self.comm.size))
-        else:
+        if file_mode != 'r':
             self.attributes('/')['nprocs'] = self.comm.size
+        # Map from function spaces to the path of their node keys.
+        self._node_keys = {}
+        self._nkeys = len(self._h5file.get("/node_keys", ()))
 
     def _set_timestamp(self, t):
         r"""Set the timestamp for storing.
@@ -350,7 +604,7 @@ class HDF5File(object):
         """
         if self._mode == 'r':
             return
-        attrs = self.attributes("/")
+        attrs = self._h5file["/"].attrs
         timestamps = attrs.get("stored_timestamps", [])
         attrs["stored_timestamps"] = np.concatenate((timestamps, [t]))
 
@@ -361,19 +615,39 @@ class HDF5File(object):
         timestamps = attrs.get("stored_timestamps", [])
         return timestamps
 
+    def _run(self, fn, *args):
+        # Writes must be performed in the same order on every process,
+        # since they are collective.
+        if self._writer is None:
+            fn(*args)
+        else:
+            self._writer.submit(fn, *args)
+
+    def wait(self):
+        r"""Wait for pending asynchronous writes to complete.
+
+        Any error raised by a write is reraised here."""
+        if self._writer is not None:
+            self._writer.flush()
+
     def close(self):
         r"""Close the checkpoint file (flushing any pending writes)"""
         if hasattr(self, '_h5file'):
-            self._h5file.flush()
-            # Need to explicitly close the h5py File so that all
-            # objects referencing it are cleaned up, otherwise we
-            # close the file, but there are still open objects and we
-            # get a refcounting error in HDF5.
-            self._h5file.close()
-            del self._h5file
+            try:
+                if self._writer is not None:
+                    self._writer.close()
+            finally:
+                self._h5file.flush()
+                # Need to explicitly close the h5py File so that all
+                # objects referencing it are cleaned up, otherwise we
+                # close the file, but there are still open objects and we
+                # get a refcounting error in HDF5.
+                self._h5file.close()
+                del self._h5file
 
     def flush(self):
         r"""Flush any pending writes."""
+        self.wait()
         self._h5file.flush()
 
     def write(self, function, path, timestamp=None):
@@ -383,6 +657,10 @@ class HDF5File(object):
         :arg path: the path to store the function under.
         :arg timestamp: timestamp associated with function, or None for
                         stationary data
+
+        In asynchronous mode, this returns as soon as the function's
+        values have been copied, and the function may then be
+        modified.
         """
         if self._mode == 'r':
             raise IOError("Cannot store to checkpoint opened with mode 'FILE_READ'")
@@ -393,20 +671,54 @@ class HDF5File(object):
             suffix = "/%.15e" % timestamp
             path = path + suffix
 
-        with function.dat.vec_ro as v:
-            dset = self._h5file.create_dataset(path, shape=(v.getSize(),), dtype=function.dat.dtype)
+        attrs = {"nprocs": self.comm.size}
+        V = function.function_space()
+        if _redistributable(V):
+            attrs["node_keys"] = self._write_node_keys(V)
+        if timestamp is not None:
+            attrs["timestamp"] = timestamp
 
-            # Another MPI/non-MPI difference
-            try:
-                with dset.collective:
-                    dset[slice(*v.getOwnershipRange())] = v.array_r
-            except AttributeError:
-                dset[slice(*v.getOwnershipRange())] = v.array_r
+        with function.dat.vec_ro as v:
+            idx = slice(*v.getOwnershipRange())
+            self._check_nonempty(idx)
+            if self._writer is None:
+                self._write_array(path, (v.getSize(), ), idx, v.array_r, attrs)
+            else:
+                free = self._buffers.setdefault(function, [])
+                values = free.pop() if free else np.empty_like(v.array_r)
+                values[:] = v.array_r
+                self._writer.submit(self._write_array, path, (v.getSize(), ), idx, values, attrs, free)
 
         if timestamp is not None:
-            attr = self.attributes(path)
-            attr["timestamp"] = timestamp
-            self._set_timestamp(timestamp)
+            self._run(self._set_timestamp, timestamp)
+
+    def _check_nonempty(self, idx):
+        # Parallel HDF5 can only write filtered datasets collectively,
+        # which h5py skips on processes with no data.
+        if "compression" in self._create_args and self.comm.size > 1:
+            if not self.comm.allreduce(idx.stop > idx.start, op=MPI.LAND):
+                raise ValueError("Compressed parallel writes need data on every process")
+
+    def _write_array(self, path, shape, idx, values, attrs, free=None):
+        r"""Create a dataset and write this process' part of it.
+
+        :arg path: The path of the dataset.
+        :arg shape: The global shape.
+        :arg idx: The rows to write on this process.
+        :arg values: The values to write.
+        :arg attrs: Attributes to set on the dataset.
+        :arg free: If not ``None``, a list to append ``values`` to
+            once written.
+        """
+        create_args = dict(self._create_args)
+        if self._chunks is not None:
+            create_args["chunks"] = (max(min(self._chunks, shape[0]), 1), ) + shape[1:]
+        dset = self._h5file.create_dataset(path, shape=shape, dtype=values.dtype, **create_args)
+        self._write_slice(dset, idx, values)
+        for name, value in attrs.items():
+            dset.attrs[name] = value
+        if free is not None:
+            free.append(values)
 
     def read(self, function, path, timestamp=None):
         r"""Store a function from the checkpoint file.
@@ -420,12 +732,155 @@ class HDF5File(object):
             suffix = "/%.15e" % timestamp
             path = path + suffix
 
+        self.wait()
+        dset = self._h5file[path]
+        nprocs = dset.attrs.get("nprocs", self.attributes('/')['nprocs'])
+        if nprocs == self.comm.size:
+            with function.dat.vec_wo as v:
+                v.array[:] = dset[slice(*v.getOwnershipRange())]
+        elif "node_keys" in dset.attrs:
+            self._read_redistributed(function, dset)
+        else:
+            raise ValueError("Process mismatch: written on %d, have %d" %
+                             (nprocs, self.comm.size))
+
+    def read_mapped(self, V, path, timestamp=None, name=None):
+        r"""Return a function whose values are memory-mapped from the
+        checkpoint file.
+
+        No data is read until the values are accessed, and then only
+        the pages that are touched, so this is suitable for scanning
+        through many stored functions, for example when
+        post-processing.  The mapping is copy-on-write: the function
+        may be modified, but the file never is.
+
+        :arg V: The function space of the stored function.
+        :arg path: the path under which the function is stored.
+        :arg timestamp: timestamp associated with the function, or None
+            for stationary data.
+        :arg name: An optional name for the new function.
+        :returns: A new :class:`~.Function`.
+
+        This is only supported in serial, for functions written in
+        serial to contiguous datasets (that is, without compression
+        or chunking).
+        """
+        if self.comm.size > 1:
+            raise ValueError("Memory-mapped reading is only supported in serial")
+        if timestamp is not None:
+            suffix = "/%.15e" % timestamp
+            path = path + suffix
+
+        self.flush()
+        dset = self._h5file[path]
+        nprocs = dset.attrs.get("nprocs", self.attributes('/')['nprocs'])
+        if nprocs != 1:
+            raise ValueError("Process mismatch: written on %d, have %d" %
+                             (nprocs, self.comm.size))
+        offset = dset.id.get_offset()
+        if dset.chunks is not None or offset is None:
+            raise ValueError("Dataset '%s' is not stored contiguously, cannot memory-map it" % path)
+        sizes = [Vi.dof_dset.size * Vi.value_size for Vi in V]
+        if dset.shape != (sum(sizes), ):
+            raise ValueError("Function space does not match the stored function")
+        if dset.dtype != np.dtype(ScalarType):
+            raise ValueError("Stored function has type %s, expecting %s" % (dset.dtype, ScalarType))
+
+        values = np.memmap(self._filename, dtype=dset.dtype, mode="c",
+                           offset=offset, shape=dset.shape)
+        if len(V) > 1:
+            values = np.split(values, np.cumsum(sizes)[:-1])
+        return firedrake.Function(V, val=values, name=name)
+
+    @staticmethod
+    def _write_slice(dset, idx, values):
+        # Another MPI/non-MPI difference
+        try:
+            with dset.collective:
+                dset[idx] = values
+        except AttributeError:
+            dset[idx] = values
+
+    def _write_node_keys(self, V):
+        r"""Store the keys identifying the nodes of a function space
+        (once per file).
+
+        :arg V: The function space.
+        :returns: The path of the keys.
+        """
+        try:
+            return self._node_keys[V]
+        except KeyError:
+            pass
+        keys = _node_keys(V)
+        coordinates = V.mesh().coordinates.dat.data_ro.reshape(-1, V.mesh().geometric_dimension())
+        lo = np.empty(coordinates.shape[1])
+        hi = np.empty_like(lo)
+        self.comm.Allreduce(coordinates.real.min(axis=0, initial=np.inf), lo, op=MPI.MIN)
+        self.comm.Allreduce(coordinates.real.max(axis=0, initial=-np.inf), hi, op=MPI.MAX)
+        # Quantise on a grid much finer than any node spacing, so that
+        # rounding errors in the computation of the node positions do
+        # not change the keys.
+        resolution = max((hi - lo).max(), 1.0) * 2.0**-30
+
+        nowned = len(keys)
+        start = self.comm.exscan(nowned) or 0
+        nnodes = self.comm.allreduce(nowned)
+
+        path = "/node_keys/%d" % (self._nkeys + len(self._node_keys))
+        self._check_nonempty(slice(start, start + nowned))
+        self._run(self._write_array, path, (nnodes, keys.shape[1]), slice(start, start + nowned),
+                  keys, {"resolution": resolution})
+        self._node_keys[V] = path
+        return path
+
+    def _read_redistributed(self, function, dset):
+        r"""Load a function written on a different number of processes.
+
+        Each process reads a contiguous share of the stored rows.
+        Stored and local nodes are matched up by their keys through a
+        distributed directory, and the values are then moved from the
+        stored rows to the local nodes with a PETSc scatter.
+
+        :arg function: The function to load values into.
+        :arg dset: The dataset the function is stored in.
+        """
+        V = function.function_space()
+        if not _redistributable(V):
+            raise NotImplementedError("Can only reload %s on a different number of processes "
+                                      "for point evaluation elements" % V)
+        keys = self._h5file[dset.attrs["node_keys"]]
+        resolution = keys.attrs["resolution"]
+        comm = self.comm
+        bs = function.dat.cdim
+
+        nrows = keys.shape[0]
+        start = (nrows * comm.rank) // comm.size
+        end = (nrows * (comm.rank + 1)) // comm.size
+        stored = _quantise(keys[start:end], resolution)
+        local = _quantise(_node_keys(V), resolution)
+        if nrows * bs != dset.shape[0] or stored.shape[1] != local.shape[1] \
+           or comm.allreduce(len(local)) != nrows:
+            raise ValueError("Function space does not match the stored function")
+
+        rows = _match_rows(comm, stored, start, local)
+        if comm.allreduce((rows < 0).any(), op=MPI.LOR):
+            raise ValueError("Mesh does not match the stored function")
+
         with function.dat.vec_wo as v:
-            dset = self._h5file[path]
-            v.array[:] = dset[slice(*v.getOwnershipRange())]
+            source = PETSc.Vec().createMPI(((end - start) * bs, nrows * bs), bsize=bs, comm=comm)
+            source.array[:] = dset[start * bs:end * bs]
+            is_from = PETSc.IS().createBlock(bs, rows.astype(IntType), comm=comm)
+            is_to = PETSc.IS().createStride(v.getLocalSize(), v.getOwnershipRange()[0], 1, comm=comm)
+            scatter = PETSc.Scatter().create(source, is_from, v, is_to)
+            scatter.scatterBegin(source, v, addv=PETSc.InsertMode.INSERT_VALUES)
+            scatter.scatterEnd(source, v, addv=PETSc.InsertMode.INSERT_VALUES)
+            scatter.destroy()
+            source.destroy()
 
     def attributes(self, obj):
         r""":arg obj: The path to the group."""
+        self.wait()
         return self._h5file[obj].attrs
 
     def __enter__(self):
@@ -6,6 +6,7 @@ import ctypes
 import cython
 from libc.stdint cimport uintptr_t
 from libc.stdlib cimport free
+from libc.math cimport floor
 
 include "spatialindexinc.pxi"
 
@@ -83,6 +84,39 @@ def from_regions(np.ndarray[np.float64_t, ndim=2, mode="c"] regions_lo,
     return spatial_index
 
 
+@cython.boundscheck(False)
+@cython.wraparound(False)
+def update_regions(SpatialIndex sidx not None,
+                   np.ndarray[np.int64_t, ndim=1, mode="c"] ids,
+                   np.ndarray[np.float64_t, ndim=2, mode="c"] old_lo,
+                   np.ndarray[np.float64_t, ndim=2, mode="c"] old_hi,
+                   np.ndarray[np.float64_t, ndim=2, mode="c"] new_lo,
+                   np.ndarray[np.float64_t, ndim=2, mode="c"] new_hi):
+    """Moves regions in a spatial index.
+
+    :arg sidx: the SpatialIndex
+    :arg ids: the ids of the regions to move
+    :arg old_lo: the current lower corners of the regions
+    :arg old_hi: the current higher corners of the regions
+    :arg new_lo: the new lower corners of the regions
+    :arg new_hi: the new higher corners of the regions
+    """
+    cdef:
+        int64_t i
+        uint32_t dim
+        RTError err
+
+    assert old_lo.shape[0] == ids.shape[0] and new_lo.shape[0] == ids.shape[0]
+    dim = old_lo.shape[1]
+    for i in range(ids.shape[0]):
+        err = Index_DeleteData(sidx.index, ids[i], &old_lo[i, 0], &old_hi[i, 0], dim)
+        if err != RT_None:
+            raise RuntimeError("failed to delete data from spatial index")
+        err = Index_InsertData(sidx.index, ids[i], &new_lo[i, 0], &new_hi[i, 0], dim, NULL, 0)
+        if err != RT_None:
+            raise RuntimeError("failed to insert data into spatial index")
+
+
 def bounding_boxes(SpatialIndex sidx not None, np.ndarray[np.float64_t, ndim=1] x):
     """Given a spatial index and a point, return the bounding boxes the point is in.
 
@@ -104,3 +138,127 @@ def bounding_boxes(SpatialIndex sidx not None, np.ndarray[np.float64_t, ndim=1]
         pyids[i] = ids[i]
     free(ids)
     return pyids
+
+
+cdef struct GridIndexData:
+    int dim
+    double lo[3]
+    double inv_h[3]
+    int n[3]
+    int64_t *offsets
+    int64_t *ids
+
+
+cdef class GridIndex(object):
+    """Python class for holding a uniform grid spatial index.
+
+    Each cell of the grid stores the ids of the regions which overlap
+    it, so the index is cheap to rebuild, for example after the mesh
+    has moved."""
+
+    cdef GridIndexData data
+    cdef readonly np.ndarray offsets
+    cdef readonly np.ndarray ids
+
+    @property
+    def ctypes(self):
+        """Returns a ctypes pointer to the native grid index."""
+        return ctypes.c_void_p(<uintptr_t> &self.data)
+
+
+cdef inline int64_t grid_bin(double x, double lo, double inv_h, int n):
+    cdef int64_t i = <int64_t> floor((x - lo) * inv_h)
+    if i < 0:
+        return 0
+    if i >= n:
+        return n - 1
+    return i
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+def grid_from_regions(np.ndarray[np.float64_t, ndim=2, mode="c"] regions_lo,
+                      np.ndarray[np.float64_t, ndim=2, mode="c"] regions_hi):
+    """Builds a uniform grid spatial index from a set of maximum bounding regions (MBRs).
+
+    regions_lo and regions_hi must have the same size.
+    regions_lo[i] and regions_hi[i] contain the coordinates of the diagonally
+    opposite lower and higher corners of the i-th MBR, respectively.
+
+    The grid spacing is the mean extent of the regions, limited so
+    that there are at most four grid cells per region.
+    """
+    cdef:
+        GridIndex grid
+        int64_t i, i0, i1, i2, b, nregions
+        int d, dim
+        int64_t a[3]
+        int64_t z[3]
+        np.ndarray[np.int64_t, ndim=1, mode="c"] offsets
+        np.ndarray[np.int64_t, ndim=1, mode="c"] ids
+        np.ndarray[np.int64_t, ndim=1, mode="c"] fill
+
+    assert regions_lo.shape[0] == regions_hi.shape[0]
+    assert regions_lo.shape[1] == regions_hi.shape[1]
+    nregions = regions_lo.shape[0]
+    dim = regions_lo.shape[1]
+    if dim > 3:
+        raise ValueError("grid spatial index supports at most 3 dimensions")
+
+    grid = GridIndex()
+    grid.data.dim = dim
+    lo = np.zeros(3)
+    n = np.ones(3, dtype=np.int64)
+    inv_h = np.zeros(dim)
+    if nregions > 0:
+        lo[:dim] = regions_lo.min(axis=0)
+        extent = regions_hi.max(axis=0) - lo[:dim]
+        h = (regions_hi - regions_lo).mean(axis=0)
+        n[:dim] = np.where(h > 0, np.ceil(extent / np.where(h > 0, h, 1)), 1)
+        n[:dim] = np.maximum(n[:dim], 1)
+        scale = (np.prod(n, dtype=np.float64) / (4 * nregions)) ** (1.0 / dim)
+        if scale > 1:
+            n[:dim] = np.maximum(np.floor(n[:dim] / scale), 1)
+        inv_h = np.where(extent > 0, n[:dim] / np.where(extent > 0, extent, 1), 0)
+    for d in range(3):
+        grid.data.lo[d] = lo[d]
+        grid.data.n[d] = n[d]
+        grid.data.inv_h[d] = inv_h[d] if d < dim else 0
+
+    # Count the regions overlapping each grid cell, then fill them in
+    offsets = np.zeros(np.prod(n) + 1, dtype=np.int64)
+    for i in range(nregions):
+        for d in range(3):
+            a[d] = 0
+            z[d] = 0
+            if d < dim:
+                a[d] = grid_bin(regions_lo[i, d], grid.data.lo[d], grid.data.inv_h[d], grid.data.n[d])
+                z[d] = grid_bin(regions_hi[i, d], grid.data.lo[d], grid.data.inv_h[d], grid.data.n[d])
+        for i0 in range(a[0], z[0] + 1):
+            for i1 in range(a[1], z[1] + 1):
+                for i2 in range(a[2], z[2] + 1):
+                    b = (i0 * grid.data.n[1] + i1) * grid.data.n[2] + i2
+                    offsets[b + 1] += 1
+    offsets = np.cumsum(offsets)
+
+    ids = np.empty(offsets[offsets.shape[0] - 1], dtype=np.int64)
+    fill = offsets[:offsets.shape[0] - 1].copy()
+    for i in range(nregions):
+        for d in range(3):
+            a[d] = 0
+            z[d] = 0
+            if d < dim:
+                a[d] = grid_bin(regions_lo[i, d], grid.data.lo[d], grid.data.inv_h[d], grid.data.n[d])
+                z[d] = grid_bin(regions_hi[i, d], grid.data.lo[d], grid.data.inv_h[d], grid.data.n[d])
+        for i0 in range(a[0], z[0] + 1):
+            for i1 in range(a[1], z[1] + 1):
+                for i2 in range(a[2], z[2] + 1):
+                    b = (i0 * grid.data.n[1] + i1) * grid.data.n[2] + i2
+                    ids[fill[b]] = i
+                    fill[b] += 1
+
+    grid.offsets = offsets
+    grid.ids = ids
+    grid.data.offsets = &offsets[0]
+    grid.data.ids = <int64_t *> ids.data
+    return grid
@@ -43,6 +43,8 @@ cdef extern from "spatialindex/capi/sidx_api.h":
     RTError Index_InsertData(IndexH index, int64_t id,
                              double* pdMin, double* pdMax, uint32_t nDimension,
                              const uint8_t* pData, uint32_t nDataLength)
+    RTError Index_DeleteData(IndexH index, int64_t id,
+                             double* pdMin, double* pdMax, uint32_t nDimension)
     RTError Index_Intersects_id(IndexH index, double* pdMin, double* pdMax, uint32_t nDimension,
                                 int64_t** ids, uint64_t* nResults)
     void Index_Destroy(IndexH index)
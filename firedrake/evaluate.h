@@ -1,12 +1,29 @@
 #ifndef _EVALUATE_H
 #define _EVALUATE_H
 
+#include <stdint.h>
 #include <petsc.h>
 
 #ifdef __cplusplus
 extern "C" {
 #endif
 
+struct GridIndex {
+	/* Geometric dimension (at most 3) */
+	int dim;
+
+	/* Lower corner and inverse spacing of the grid */
+	double lo[3];
+	double inv_h[3];
+
+	/* Number of grid cells in each direction (1 beyond dim) */
+	int n[3];
+
+	/* Region ids in each grid cell in CSR format */
+	int64_t *offsets;
+	int64_t *ids;
+};
+
 struct Function {
 	/* Number of cells in the base mesh */
 	int n_cols;
@@ -28,6 +45,9 @@ struct Function {
 	/* Spatial index */
 	void *sidx;
 
+	/* Uniform grid spatial index (used instead of sidx if set) */
+	struct GridIndex *grid;
+
 	/*
 	 * TODO:
 	 * - cell orientation
@@ -56,6 +76,18 @@ extern int evaluate(struct Function *f,
 		    PetscScalar *x,
 		    PetscScalar *result);
 
+extern int evaluate_points(struct Function *f,
+			   PetscScalar *x,
+			   int npoints,
+			   PetscScalar *result,
+			   int *found);
+
+extern int evaluate_reference_points(struct Function *f,
+				     int npoints,
+				     int *cells,
+				     double *X,
+				     PetscScalar *result);
+
 #ifdef __cplusplus
 }
 #endif
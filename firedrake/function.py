@@ -9,6 +9,7 @@ from pyop2 import op2
 from pyop2.datatypes import ScalarType, IntType, as_ctypes
 
 from firedrake import functionspaceimpl
+import firedrake.cython.spatialindex as spatialindex
 from firedrake.logging import warning
 from firedrake import utils
 from firedrake import vector
@@ -20,7 +21,7 @@ except ImportError:
     cachetools = None
 
 
-__all__ = ['Function', 'PointNotInDomainError']
+__all__ = ['Function', 'PointNotInDomainError', 'PointEvaluator']
 
 
 class _CFunction(ctypes.Structure):
@@ -33,7 +34,8 @@ class _CFunction(ctypes.Structure):
                 # FIXME: what if f does not have type double?
                 ("f", POINTER(c_double)),
                 ("f_map", POINTER(as_ctypes(IntType))),
-                ("sidx", c_void_p)]
+                ("sidx", c_void_p),
+                ("grid", c_void_p)]
 
 
 class CoordinatelessFunction(ufl.Coefficient):
@@ -486,7 +488,13 @@ class Function(ufl.Coefficient, FunctionMixin):
     def _ctypes(self):
         mesh = self.ufl_domain()
         c_function = self._constant_ctypes
-        c_function.sidx = mesh.spatial_index and mesh.spatial_index.ctypes
+        spatial_index = mesh.spatial_index
+        if isinstance(spatial_index, spatialindex.GridIndex):
+            c_function.sidx = None
+            c_function.grid = spatial_index.ctypes
+        else:
+            c_function.sidx = spatial_index and spatial_index.ctypes
+            c_function.grid = None
 
         # Return pointer
         return ctypes.pointer(c_function)
@@ -501,6 +509,46 @@ class Function(ufl.Coefficient, FunctionMixin):
             result.restype = c_int
             return cache.setdefault(tolerance, result)
 
+    def _c_evaluate_points(self, tolerance=None):
+        cache = self.__dict__.setdefault("_c_evaluate_points_cache", {})
+        try:
+            return cache[tolerance]
+        except KeyError:
+            result = make_c_evaluate(self, c_name="evaluate_points", tolerance=tolerance)
+            result.argtypes = [POINTER(_CFunction), POINTER(c_double), c_int,
+                               POINTER(c_double), POINTER(c_int)]
+            result.restype = c_int
+            return cache.setdefault(tolerance, result)
+
+    @utils.cached_property
+    def _c_evaluate_reference_points(self):
+        result = make_c_evaluate(self, c_name="evaluate_reference_points")
+        result.argtypes = [POINTER(_CFunction), c_int, POINTER(c_int),
+                           POINTER(c_double), POINTER(c_double)]
+        result.restype = c_int
+        return result
+
+    def _evaluate_points(self, points, tolerance=None):
+        r"""Evaluate this (non-mixed) :class:`Function` at many points
+        with a single call into compiled code.
+
+        :arg points: a C-contiguous array of shape ``(N, gdim)``.
+        :kwarg tolerance: Tolerance to use when checking for points in cell.
+        :returns: a tuple ``(values, found)`` where ``values`` has
+            shape ``(N, ) + value_shape`` and ``found`` is a boolean
+            array marking the points located on this process.
+        """
+        npoints = len(points)
+        values = np.zeros((npoints, ) + self.ufl_shape, dtype=float)
+        found = np.zeros(npoints, dtype=np.intc)
+        if npoints:
+            self._c_evaluate_points(tolerance=tolerance)(self._ctypes,
+                                                         points.ctypes.data_as(POINTER(c_double)),
+                                                         npoints,
+                                                         values.ctypes.data_as(POINTER(c_double)),
+                                                         found.ctypes.data_as(POINTER(c_int)))
+        return values, found.astype(bool)
+
     def evaluate(self, coord, mapping, component, index_values):
         # Called by UFL when evaluating expressions at coordinates
         if component or index_values:
@@ -555,61 +603,34 @@ class Function(ufl.Coefficient, FunctionMixin):
         if diff_arg:
             raise ValueError("Points to evaluate are inconsistent among processes.")
 
-        def single_eval(x, buf):
-            r"""Helper function to evaluate at a single point."""
-            err = self._c_evaluate(tolerance=tolerance)(self._ctypes,
-                                                        x.ctypes.data_as(POINTER(c_double)),
-                                                        buf.ctypes.data_as(POINTER(c_double)))
-            if err == -1:
-                raise PointNotInDomainError(self.function_space().mesh(), x.reshape(-1))
-
         if not len(arg.shape) <= 2:
             raise ValueError("Function.at expects point or array of points.")
-        points = arg.reshape(-1, arg.shape[-1])
-        value_shape = self.ufl_shape
+        points = np.ascontiguousarray(arg.reshape(-1, arg.shape[-1]))
 
         split = self.split()
         mixed = len(split) != 1
 
-        # Local evaluation
-        l_result = []
-        for i, p in enumerate(points):
-            try:
-                if mixed:
-                    l_result.append((i, tuple(f.at(p) for f in split)))
-                else:
-                    p_result = np.zeros(value_shape, dtype=float)
-                    single_eval(points[i:i+1], p_result)
-                    l_result.append((i, p_result))
-            except PointNotInDomainError:
-                # Skip point
-                pass
+        # Local evaluation: one compiled call per component for all points
+        l_found = np.ones(len(points), dtype=bool)
+        l_values = []
+        for f in split:
+            values, found = f._evaluate_points(points, tolerance=tolerance)
+            l_values.append(values)
+            l_found &= found
 
         # Collecting the results
-        def same_result(a, b):
-            if mixed:
-                for a_, b_ in zip(a, b):
-                    if not np.allclose(a_, b_):
-                        return False
-                return True
-            else:
-                return np.allclose(a, b)
-
-        all_results = self.comm.allgather(l_result)
-        g_result = [None] * len(points)
-        for results in all_results:
-            for i, result in results:
-                if g_result[i] is None:
-                    g_result[i] = result
-                elif same_result(result, g_result[i]):
-                    pass
-                else:
-                    raise RuntimeError("Point evaluation gave different results across processes.")
-
-        if not dont_raise:
-            for i in range(len(g_result)):
-                if g_result[i] is None:
-                    raise PointNotInDomainError(self.function_space().mesh(), points[i].reshape(-1))
+        g_found, g_values = _gather_point_results(self.comm, l_found, l_values)
+
+        if not dont_raise and not g_found.all():
+            i = np.flatnonzero(~g_found)[0]
+            raise PointNotInDomainError(self.function_space().mesh(), points[i].reshape(-1))
+
+        if mixed:
+            g_result = list(zip(*g_values))
+        else:
+            g_result = list(g_values[0])
+        for i in np.flatnonzero(~g_found):
+            g_result[i] = None
 
         if len(arg.shape) == 1:
             g_result = g_result[0]
@@ -630,6 +651,240 @@ class PointNotInDomainError(Exception):
         return "domain %s does not contain point %s" % (self.domain, self.point)
 
 
+def _gather_point_results(comm, found, values):
+    r"""Combine point evaluation results from all processes.
+
+    The value at each point is taken from the lowest ranked process
+    which found it, and communicated with reductions so that the
+    traffic per process does not grow with the number of processes.
+
+    :arg comm: the communicator to combine over.
+    :arg found: boolean array marking the points found on this process.
+    :arg values: list of value arrays (one per component), indexed by point.
+    :returns: a tuple ``(found, values)`` for all processes.
+    """
+    from mpi4py import MPI
+
+    owner = np.where(found, comm.rank, comm.size).astype(np.intc)
+    g_owner = np.empty_like(owner)
+    comm.Allreduce(owner, g_owner, op=MPI.MIN)
+    mine = g_owner == comm.rank
+    g_values = []
+    for v in values:
+        v = np.where(mine.reshape((-1, ) + (1, ) * (v.ndim - 1)), v, 0)
+        g = np.empty_like(v)
+        comm.Allreduce(v, g, op=MPI.SUM)
+        g_values.append(g)
+    return g_owner < comm.size, g_values
+
+
+def _displacements(counts):
+    return np.concatenate(([0], np.cumsum(counts)[:-1])).astype(np.intc)
+
+
+def _alltoallv(comm, sendbuf, sendcounts, recvcounts):
+    r"""Exchange the rows of an array with all processes.
+
+    :arg comm: the communicator.
+    :arg sendbuf: array whose rows are ordered by destination rank.
+    :arg sendcounts: number of rows to send to each rank.
+    :arg recvcounts: number of rows to receive from each rank.
+    :returns: the received rows, ordered by source rank.
+    """
+    sendbuf = np.ascontiguousarray(sendbuf)
+    row = int(np.prod(sendbuf.shape[1:], dtype=int))
+    recvbuf = np.empty((sum(recvcounts), ) + sendbuf.shape[1:], dtype=sendbuf.dtype)
+    sendcounts = np.asarray(sendcounts, dtype=np.intc) * row
+    recvcounts = np.asarray(recvcounts, dtype=np.intc) * row
+    comm.Alltoallv([sendbuf, (sendcounts, _displacements(sendcounts))],
+                   [recvbuf, (recvcounts, _displacements(recvcounts))])
+    return recvbuf
+
+
+def _allgatherv(comm, sendbuf, counts):
+    r"""Gather the rows of an array from all processes onto all processes.
+
+    :arg comm: the communicator.
+    :arg sendbuf: the rows on this process.
+    :arg counts: number of rows on each rank.
+    """
+    sendbuf = np.ascontiguousarray(sendbuf)
+    row = int(np.prod(sendbuf.shape[1:], dtype=int))
+    recvbuf = np.empty((sum(counts), ) + sendbuf.shape[1:], dtype=sendbuf.dtype)
+    counts = np.asarray(counts, dtype=np.intc) * row
+    comm.Allgatherv(sendbuf, [recvbuf, (counts, _displacements(counts))])
+    return recvbuf
+
+
+class PointEvaluator(object):
+    r"""Evaluate :class:`Function`\s on a mesh at a fixed set of points.
+
+    The points are located in the mesh once, and their cell numbers
+    and reference coordinates are stored, so that each evaluation only
+    gathers the cell data and contracts it with the basis functions.
+    The locations are recomputed automatically when the mesh moves,
+    however its coordinates are changed.
+
+    In parallel, each point is only sent to the processes whose
+    partition bounding box contains it, and is evaluated by the lowest
+    ranked process owning a cell that contains it.  The values are
+    then sent back to the process which asked for the point.
+
+    :arg mesh: the mesh on which to evaluate.
+    :arg points: array of points, shape ``(npoints, gdim)``.
+    :kwarg tolerance: Tolerance to use when checking for points in cell.
+    :kwarg redundant: If ``True`` (the default), every process must
+        pass the same points and receives the values at all of them.
+        Otherwise each process passes its own points and receives the
+        values at only those points.
+    """
+
+    def __init__(self, mesh, points, tolerance=None, redundant=True):
+        mesh.init()
+        if mesh.variable_layers:
+            raise NotImplementedError("Point evaluation not implemented for variable layers")
+        tdim = mesh.ufl_cell().topological_dimension()
+        gdim = mesh.ufl_cell().geometric_dimension()
+        if tdim < gdim:
+            raise NotImplementedError("Point is almost certainly not on the manifold.")
+        points = np.array(points, dtype=float)
+        if points.ndim < 2 and gdim == 1:
+            points = points.reshape(-1, 1)
+        if points.ndim != 2 or points.shape[-1] != gdim:
+            raise ValueError("Points must have shape (npoints, %d)." % gdim)
+        self.mesh = mesh
+        self.points = np.ascontiguousarray(points)
+        self.tolerance = tolerance
+        self.redundant = redundant
+
+        comm = mesh.comm
+        if redundant:
+            # Each process locates an equal share of the points
+            self._sizes = np.full(comm.size, len(points) // comm.size, dtype=np.intc)
+            self._sizes[:len(points) % comm.size] += 1
+            start = self._sizes[:comm.rank].sum()
+            self._points = self.points[start:start + self._sizes[comm.rank]]
+        else:
+            self._points = self.points
+        self._key = None
+
+    def _current_key(self):
+        # Using the spatial index brings it up to date with the mesh
+        # coordinates, and its version changes whenever they do.
+        self.mesh.spatial_index
+        data = self.mesh._spatial_index_data
+        return data, data.version
+
+    def _locate(self):
+        from mpi4py import MPI
+
+        mesh = self.mesh
+        comm = mesh.comm
+        if not comm.allreduce(self._key is None or self._key != self._current_key(), op=MPI.LOR):
+            return
+
+        points = self._points
+        gdim = points.shape[1]
+        coords = mesh.coordinates.dat.data_ro_with_halos.reshape(-1, gdim)
+        if len(coords):
+            lo = coords.min(axis=0)
+            hi = coords.max(axis=0)
+            pad = (hi - lo) * (self.tolerance or 1e-14)
+            lo, hi = lo - pad, hi + pad
+        else:
+            lo = np.full(gdim, np.inf)
+            hi = np.full(gdim, -np.inf)
+
+        # Send each point to the processes whose bounding box contains it
+        candidates = [np.flatnonzero(np.all((points >= lo) & (points <= hi), axis=1))
+                      for lo, hi in comm.allgather((lo, hi))]
+        send_idx = np.concatenate(candidates).astype(IntType)
+        sendcounts = np.array([len(c) for c in candidates], dtype=np.intc)
+        recvcounts = np.array(comm.alltoall(sendcounts.tolist()), dtype=np.intc)
+        recv_points = _alltoallv(comm, points[send_idx], sendcounts, recvcounts)
+
+        # Only look for points in cells owned by this process, so that
+        # points on the partition boundary are not found in a halo
+        # cell instead.
+        cells, X = mesh.locate_cells_ref_coords(recv_points, tolerance=self.tolerance, owned=True)
+
+        # The lowest ranked process that found a point evaluates it
+        found = _alltoallv(comm, (cells != -1).astype(np.intc), recvcounts, sendcounts) == 1
+        ranks = np.repeat(np.arange(comm.size, dtype=np.intc), sendcounts)
+        owner = np.full(len(points), comm.size, dtype=np.intc)
+        np.minimum.at(owner, send_idx[found], ranks[found])
+        wanted = owner[send_idx] == ranks
+        evaluate = _alltoallv(comm, wanted.astype(np.intc), sendcounts, recvcounts) == 1
+
+        recv_ranks = np.repeat(np.arange(comm.size, dtype=np.intc), recvcounts)
+        self.cells = np.ascontiguousarray(cells[evaluate])
+        self.reference_coordinates = np.ascontiguousarray(X[evaluate])
+        self._value_sendcounts = np.bincount(recv_ranks[evaluate], minlength=comm.size)
+        self._value_recvcounts = np.bincount(ranks[wanted], minlength=comm.size)
+        self._value_idx = send_idx[wanted]
+        self.found = owner < comm.size
+        self._key = self._current_key()
+
+    def evaluate(self, function, dont_raise=False):
+        r"""Evaluate a :class:`Function` at the points.
+
+        This is collective over the communicator of the mesh.
+
+        :arg function: the :class:`Function` to evaluate, defined on
+            the mesh of this :class:`PointEvaluator`.
+        :kwarg dont_raise: Do not raise an error if a point is not
+            found; the values at such points are ``NaN``.
+        :returns: an array of shape ``(npoints, ) + value_shape``, or
+            a tuple of such arrays for a mixed :class:`Function`.
+        """
+        if function.ufl_domain() is not self.mesh:
+            raise ValueError("Function is not defined on the mesh of this PointEvaluator.")
+        function.dat.global_to_local_begin(op2.READ)
+        function.dat.global_to_local_end(op2.READ)
+
+        self._locate()
+        comm = self.mesh.comm
+        cells = self.cells
+        ncells = len(cells)
+        shapes = []
+        l_values = []
+        for f in function.split():
+            values = np.zeros((ncells, ) + f.ufl_shape, dtype=float)
+            if ncells:
+                f._c_evaluate_reference_points(f._ctypes, ncells,
+                                               cells.ctypes.data_as(POINTER(c_int)),
+                                               self.reference_coordinates.ctypes.data_as(POINTER(c_double)),
+                                               values.ctypes.data_as(POINTER(c_double)))
+            shapes.append(f.ufl_shape)
+            l_values.append(values.reshape(ncells, -1))
+
+        # Send the values back to the processes which asked for them
+        l_values = _alltoallv(comm, np.concatenate(l_values, axis=1),
+                              self._value_sendcounts, self._value_recvcounts)
+        values = np.zeros((len(self._points), l_values.shape[1]), dtype=float)
+        values[self._value_idx] = l_values
+        found = self.found
+        if self.redundant:
+            values = _allgatherv(comm, values, self._sizes)
+            found = _allgatherv(comm, found.astype(np.intc), self._sizes) == 1
+
+        if not found.all():
+            if not dont_raise:
+                i = np.flatnonzero(~found)[0]
+                raise PointNotInDomainError(self.mesh, self.points[i])
+            values[~found] = np.nan
+
+        result = []
+        offset = 0
+        for shape in shapes:
+            size = int(np.prod(shape, dtype=int))
+            result.append(values[:, offset:offset + size].reshape((-1, ) + shape))
+            offset += size
+        if len(result) == 1:
+            return result[0]
+        return tuple(result)
+
+
 def make_c_evaluate(function, c_name="evaluate", ldargs=None, tolerance=None):
     r"""Generates, compiles and loads a C function to evaluate the
     given Firedrake :class:`Function`."""
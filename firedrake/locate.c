@@ -1,9 +1,61 @@
 #include <stdio.h>
 #include <stdlib.h>
+#include <math.h>
 #include <spatialindex/capi/sidx_api.h>
 
 #include <evaluate.h>
 
+static int try_candidates(struct Function *f,
+        double *x,
+        int64_t *ids,
+        uint64_t nids,
+        inside_predicate try_candidate,
+        inside_predicate_xtr try_candidate_xtr,
+        void *data_)
+{
+    if (f->extruded == 0) {
+        for (int i = 0; i < nids; i++) {
+            if ((*try_candidate)(data_, f, ids[i], x)) {
+                return ids[i];
+            }
+        }
+    }
+    else {
+        for (int i = 0; i < nids; i++) {
+            int nlayers = f->n_layers;
+            int c = ids[i] / nlayers;
+            int l = ids[i] % nlayers;
+            if ((*try_candidate_xtr)(data_, f, c, l, x)) {
+                return ids[i];
+            }
+        }
+    }
+    return -1;
+}
+
+static int64_t grid_bin(struct GridIndex *grid, double *x)
+{
+    int64_t bin = 0;
+    for (int d = 0; d < 3; d++) {
+        int64_t i = 0;
+        if (d < grid->dim) {
+            double t = (x[d] - grid->lo[d]) * grid->inv_h[d];
+            /* Allow for roundoff at the edges of the grid */
+            if (t < -1 || t >= grid->n[d] + 1) {
+                return -1;
+            }
+            i = (int64_t) floor(t);
+            if (i < 0) {
+                i = 0;
+            } else if (i >= grid->n[d]) {
+                i = grid->n[d] - 1;
+            }
+        }
+        bin = bin * grid->n[d] + i;
+    }
+    return bin;
+}
+
 int locate_cell(struct Function *f,
         double *x,
         int dim,
@@ -14,7 +66,15 @@ int locate_cell(struct Function *f,
     RTError err;
     int cell = -1;
 
-    if (f->sidx) {
+    if (f->grid) {
+        int64_t bin = grid_bin(f->grid, x);
+        if (bin != -1) {
+            int64_t start = f->grid->offsets[bin];
+            int64_t end = f->grid->offsets[bin + 1];
+            cell = try_candidates(f, x, f->grid->ids + start, end - start,
+                                  try_candidate, try_candidate_xtr, data_);
+        }
+    } else if (f->sidx) {
         int64_t *ids = NULL;
         uint64_t nids = 0;
         err = Index_Intersects_id(f->sidx, x, x, dim, &ids, &nids);
@@ -22,25 +82,7 @@ int locate_cell(struct Function *f,
             fputs("ERROR: Index_Intersects_id failed in libspatialindex!", stderr);
             return -1;
         }
-        if (f->extruded == 0) {
-            for (int i = 0; i < nids; i++) {
-                if ((*try_candidate)(data_, f, ids[i], x)) {
-                    cell = ids[i];
-                    break;
-                }
-            }
-        }
-        else {
-            for (int i = 0; i < nids; i++) {
-                int nlayers = f->n_layers;
-                int c = ids[i] / nlayers;
-                int l = ids[i] % nlayers;
-                if ((*try_candidate_xtr)(data_, f, c, l, x)) {
-                    cell = ids[i];
-                    break;
-                }
-            }
-        }
+        cell = try_candidates(f, x, ids, nids, try_candidate, try_candidate_xtr, data_);
         free(ids);
     } else {
         if (f->extruded == 0) {
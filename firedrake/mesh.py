@@ -699,9 +699,6 @@ class MeshTopology(object):
         """Returns None (only for extruded use)."""
         return None
 
-    def _order_data_by_cell_index(self, column_list, cell_data):
-        return cell_data[column_list]
-
     def cell_orientations(self):
         """Return the orientation of each cell in the mesh.
 
@@ -1003,12 +1000,6 @@ class ExtrudedMeshTopology(MeshTopology):
         """
         return (self._base_mesh.facet_dimension(), 1)
 
-    def _order_data_by_cell_index(self, column_list, cell_data):
-        cell_list = []
-        for col in column_list:
-            cell_list += list(range(col, col + (self.layers - 1)))
-        return cell_data[cell_list]
-
 
 class MeshGeometry(ufl.Mesh, MeshGeometryMixin):
     """A representation of mesh topology and geometry."""
@@ -1109,56 +1100,208 @@ values from f.)"""
     def clear_spatial_index(self):
         """Reset the :attr:`spatial_index` on this mesh geometry.
 
-        Use this if you move the mesh (for example by reassigning to
-        the coordinate field)."""
-        try:
-            del self.spatial_index
-        except AttributeError:
-            pass
+        The index is rebuilt from scratch the next time it is used.
+        This is not needed when the mesh moves, since the index is
+        then updated automatically."""
+        self.__dict__.pop("_spatial_index_data", None)
 
     @utils.cached_property
-    def spatial_index(self):
-        """Spatial index to quickly find which cell contains a given point."""
+    def _spatial_index_cell_node_list(self):
+        """The coordinate nodes of each cell, in the cell numbering
+        used by :meth:`locate_cell`."""
+        coordinates_space = self.coordinates.function_space()
+        cell_node_list = coordinates_space.cell_node_list
+        if self.layers is not None:
+            # Extruded cells are numbered column by column
+            layers = np.arange(self.layers - 1, dtype=IntType)
+            cell_node_list = (cell_node_list[:, np.newaxis, :]
+                              + layers[np.newaxis, :, np.newaxis] * coordinates_space.offset)
+            cell_node_list = cell_node_list.reshape(-1, cell_node_list.shape[-1])
+        return cell_node_list
+
+    def _cell_bounding_boxes(self, cells=None):
+        """Compute the bounding boxes of cells.
+
+        :kwarg cells: the cells (numbered as in :meth:`locate_cell`)
+            to compute the bounding boxes of, or ``None`` for all cells.
+        :returns: a tuple of arrays ``(coords_min, coords_max)``, each
+            of shape ``(ncells, gdim)``.
+        """
+        gdim = self.ufl_cell().geometric_dimension()
+        data = self.coordinates.dat.data_ro_with_halos.reshape(-1, gdim)
+        cell_node_list = self._spatial_index_cell_node_list
+        if cells is not None:
+            cell_node_list = cell_node_list[cells]
+        cell_coords = data[cell_node_list]
+        return (np.ascontiguousarray(cell_coords.min(axis=1)),
+                np.ascontiguousarray(cell_coords.max(axis=1)))
 
-        from firedrake import function, functionspace
-        from firedrake.parloops import par_loop, READ, MIN, MAX
+    @property
+    def spatial_index(self):
+        """Spatial index to quickly find which cell contains a given point.
+
+        The kind of index is selected by ``parameters["spatial_index"]``:
+        ``"rtree"`` builds a libspatialindex R-tree, while ``"grid"``
+        builds a uniform grid, which is cheaper to rebuild after the
+        mesh moves.
+
+        The mesh coordinates are compared with those the index was
+        built from every time it is used, however the mesh was moved.
+        Only the bounding boxes of the cells with moved nodes are then
+        recomputed, and the R-tree is only rebuilt if many cells
+        moved."""
+        data = self.__dict__.get("_spatial_index_data")
+        if data is None:
+            data = self._build_spatial_index()
+        else:
+            self._update_spatial_index(data)
+        return data.index
 
+    def _make_spatial_index(self, coords_min, coords_max):
         gdim = self.ufl_cell().geometric_dimension()
+        index_type = parameters["spatial_index"]
+        if index_type not in ("rtree", "grid"):
+            raise ValueError("Unknown spatial index type '%s'" % index_type)
+        if index_type == "grid":
+            return spatialindex.grid_from_regions(coords_min, coords_max)
         if gdim <= 1:
             info_red("libspatialindex does not support 1-dimension, falling back on brute force.")
             return None
+        return spatialindex.from_regions(coords_min, coords_max)
 
-        # Calculate the bounding boxes for all cells by running a kernel
-        V = functionspace.VectorFunctionSpace(self, "DG", 0, dim=gdim)
-        coords_min = function.Function(V)
-        coords_max = function.Function(V)
-
-        coords_min.dat.data.fill(np.inf)
-        coords_max.dat.data.fill(-np.inf)
+    def _build_spatial_index(self):
+        with timed_region("SpatialIndexBuild"):
+            coords_min, coords_max = self._cell_bounding_boxes()
+            data = _SpatialIndexData(self._make_spatial_index(coords_min, coords_max),
+                                     self.coordinates.dat.data_ro_with_halos.copy(),
+                                     coords_min, coords_max)
+        self._spatial_index_data = data
+        return data
+
+    def _update_spatial_index(self, data):
+        with timed_region("SpatialIndexUpdate"):
+            coordinates = self.coordinates.dat.data_ro_with_halos
+            moved = (coordinates != data.coordinates).reshape(len(coordinates), -1).any(axis=1)
+            if moved.any():
+                cells = np.flatnonzero(moved[self._spatial_index_cell_node_list].any(axis=1))
+                coords_min, coords_max = self._cell_bounding_boxes(cells)
+                if isinstance(data.index, spatialindex.SpatialIndex) and \
+                   len(cells) <= 0.1 * len(data.coords_min):
+                    spatialindex.update_regions(data.index, cells.astype(np.int64),
+                                                data.coords_min[cells], data.coords_max[cells],
+                                                coords_min, coords_max)
+                    data.coords_min[cells] = coords_min
+                    data.coords_max[cells] = coords_max
+                else:
+                    data.coords_min[cells] = coords_min
+                    data.coords_max[cells] = coords_max
+                    if data.index is not None:
+                        data.index = self._make_spatial_index(data.coords_min, data.coords_max)
+                data.coordinates[...] = coordinates
+                data.version += 1
+
+    def locate_cells(self, xs, tolerance=None):
+        """Locate the cells containing many points with a single call
+        into compiled code.
+
+        :arg xs: array of point coordinates, shape ``(npoints, gdim)``
+        :kwarg tolerance: for checking if a point is in a cell.
+        :returns: an integer array of cell numbers, with ``-1`` for
+            points which are not in the domain.
+        """
+        cells, _ = self.locate_cells_ref_coords(xs, tolerance=tolerance)
+        return cells
 
-        cell_node_list = self.coordinates.function_space().cell_node_list
-        nodes_per_cell = len(cell_node_list[0])
+    def locate_cells_ref_coords(self, xs, tolerance=None, owned=False):
+        """Locate the cells containing many points and the reference
+        coordinates of those points within their cells.
 
-        domain = "{{[d, i]: 0 <= d < {0} and 0 <= i < {1}}}".format(gdim, nodes_per_cell)
-        instructions = """
-        for d, i
-            f_min[0, d] = fmin(f_min[0, d], f[i, d])
-            f_max[0, d] = fmax(f_max[0, d], f[i, d])
-        end
+        :arg xs: array of point coordinates, shape ``(npoints, gdim)``
+        :kwarg tolerance: for checking if a point is in a cell.
+        :kwarg owned: if ``True``, only look for the points in cells
+            owned by this process, not in halo cells.
+        :returns: a tuple ``(cells, X)`` where ``cells`` is an integer
+            array of cell numbers (``-1`` for points not in the
+            domain) and ``X`` has shape ``(npoints, tdim)``.
         """
-        par_loop((domain, instructions), ufl.dx,
-                 {'f': (self.coordinates, READ),
-                  'f_min': (coords_min, MIN),
-                  'f_max': (coords_max, MAX)},
-                 is_loopy_kernel=True)
-
-        # Reorder bounding boxes according to the cell indices we use
-        column_list = V.cell_node_list.reshape(-1)
-        coords_min = self._order_data_by_cell_index(column_list, coords_min.dat.data_ro_with_halos)
-        coords_max = self._order_data_by_cell_index(column_list, coords_max.dat.data_ro_with_halos)
-
-        # Build spatial index
-        return spatialindex.from_regions(coords_min, coords_max)
+        if self.variable_layers:
+            raise NotImplementedError("Cell location not implemented for variable layers")
+        xs = np.ascontiguousarray(xs, dtype=utils.ScalarType).reshape(-1, self.geometric_dimension())
+        npoints = len(xs)
+        cells = np.empty(npoints, dtype=np.intc)
+        X = np.empty((npoints, self.topological_dimension()), dtype=utils.ScalarType)
+        if npoints:
+            self._c_reference_locator(tolerance=tolerance)(self.coordinates._ctypes,
+                                                           xs.ctypes.data_as(ctypes.POINTER(ctypes.c_double)),
+                                                           npoints,
+                                                           cells.ctypes.data_as(ctypes.POINTER(ctypes.c_int)),
+                                                           X.ctypes.data_as(ctypes.POINTER(ctypes.c_double)),
+                                                           self.cell_set.size if owned else self.cell_set.total_size)
+        return cells, X
+
+    def _c_reference_locator(self, tolerance=None):
+        from pyop2 import compilation
+        from pyop2.utils import get_petsc_dir
+        import firedrake.function as function
+        import firedrake.pointquery_utils as pq_utils
+
+        cache = self.__dict__.setdefault("_c_reference_locator_cache", {})
+        try:
+            return cache[tolerance]
+        except KeyError:
+            src = pq_utils.src_locate_cell(self, tolerance=tolerance)
+            src += """
+    /* Only accept candidate cells (columns, if extruded) numbered below ncells */
+    struct BoundedReferenceCoords {
+        struct ReferenceCoords reference_coords;
+        int ncells;
+    };
+
+    static int to_bounded_reference_coords(void *data_, struct Function *f, int cell, double *x)
+    {
+        struct BoundedReferenceCoords *data = (struct BoundedReferenceCoords *) data_;
+        return cell < data->ncells && to_reference_coords(&data->reference_coords, f, cell, x);
+    }
+
+    static int to_bounded_reference_coords_xtr(void *data_, struct Function *f, int cell, int layer, double *x)
+    {
+        struct BoundedReferenceCoords *data = (struct BoundedReferenceCoords *) data_;
+        return cell < data->ncells && to_reference_coords_xtr(&data->reference_coords, f, cell, layer, x);
+    }
+
+    int reference_locator(struct Function *f, double *x, int npoints, int *cells, double *X, int ncells)
+    {
+        struct BoundedReferenceCoords data;
+        int nfound = 0;
+        data.ncells = ncells;
+        for (int p = 0; p < npoints; p++) {
+            cells[p] = locate_cell(f, x + p*%(geometric_dimension)d, %(geometric_dimension)d, &to_bounded_reference_coords, &to_bounded_reference_coords_xtr, &data);
+            for (int i = 0; i < %(topological_dimension)d; i++) {
+                X[p*%(topological_dimension)d + i] = data.reference_coords.X[i];
+            }
+            nfound += cells[p] != -1;
+        }
+        return nfound;
+    }
+    """ % dict(geometric_dimension=self.geometric_dimension(),
+               topological_dimension=self.topological_dimension())
+
+            locator = compilation.load(src, "c", "reference_locator",
+                                       cppargs=["-I%s" % os.path.dirname(__file__),
+                                                "-I%s/include" % sys.prefix]
+                                       + ["-I%s/include" % d for d in get_petsc_dir()],
+                                       ldargs=["-L%s/lib" % sys.prefix,
+                                               "-lspatialindex_c",
+                                               "-Wl,-rpath,%s/lib" % sys.prefix])
+
+            locator.argtypes = [ctypes.POINTER(function._CFunction),
+                                ctypes.POINTER(ctypes.c_double),
+                                ctypes.c_int,
+                                ctypes.POINTER(ctypes.c_int),
+                                ctypes.POINTER(ctypes.c_double),
+                                ctypes.c_int]
+            locator.restype = ctypes.c_int
+            return cache.setdefault(tolerance, locator)
 
     def locate_cell(self, x, tolerance=None):
         """Locate cell containg given point.
@@ -1166,6 +1309,8 @@ values from f.)"""
         :arg x: point coordinates
         :kwarg tolerance: for checking if a point is in a cell.
         :returns: cell number (int), or None (if the point is not in the domain)
+
+        To locate many points, :meth:`locate_cells` is much faster.
         """
         if self.variable_layers:
             raise NotImplementedError("Cell location not implemented for variable layers")
@@ -1258,6 +1403,19 @@ values from f.)"""
         return list(OrderedDict.fromkeys(dir(self._topology) + current))
 
 
+class _SpatialIndexData(object):
+    """A spatial index, together with the coordinates and cell
+    bounding boxes it was built from, so that it can be updated when
+    the mesh moves.  The version is incremented every time it is."""
+
+    def __init__(self, index, coordinates, coords_min, coords_max):
+        self.index = index
+        self.coordinates = coordinates
+        self.coords_min = coords_min
+        self.coords_max = coords_max
+        self.version = 0
+
+
 def make_mesh_from_coordinates(coordinates):
     """Given a coordinate field build a new mesh, using said coordinate field.
 
@@ -1,9 +1,15 @@
 import collections
+import functools
 import itertools
 import numpy
 import os
+import queue
+import shutil
+import tempfile
+import threading
 import ufl
 import weakref
+import zlib
 from itertools import chain
 from pyop2.mpi import COMM_WORLD, dup_comm
 from pyop2.datatypes import IntType
@@ -236,12 +242,68 @@ def get_byte_order(dtype):
             ">": "BigEndian"}[dtype.byteorder]
 
 
-def write_array(f, ofunction):
-    array = ofunction.array
-    numpy.uint32(array.nbytes).tofile(f)
+def get_compressor(compression, level=None):
+    """Return the VTK name of a compressor and a function compressing bytes with it.
+
+    :arg compression: ``"zlib"`` or ``"lz4"``.
+    :arg level: the compression level, or ``None`` for the default.
+    """
+    if compression == "zlib":
+        return "vtkZLibDataCompressor", functools.partial(zlib.compress,
+                                                          level=-1 if level is None else level)
+    elif compression == "lz4":
+        try:
+            import lz4.block
+        except ImportError:
+            raise ImportError("LZ4 compressed output requires the lz4 package")
+        if level is None:
+            return "vtkLZ4DataCompressor", functools.partial(lz4.block.compress, store_size=False)
+        return "vtkLZ4DataCompressor", functools.partial(lz4.block.compress, mode="high_compression",
+                                                         compression=level, store_size=False)
+    else:
+        raise ValueError("Unknown compression '%s' (not 'zlib' or 'lz4')" % compression)
+
+
+def write_encoded_array(f, array, compress=None, block_size=2**15):
+    """Write an array as VTK appended data.
+
+    Compressed blocks are written as they are produced, so only one
+    block is held in memory at a time.
+
+    :arg f: a binary file to write to, which must be seekable if the
+        data is compressed.
+    :arg array: the array to encode.
+    :arg compress: a function compressing bytes (see
+        :func:`get_compressor`), or ``None`` for raw data.
+    :arg block_size: the size in bytes of the blocks compressed separately.
+    :returns: the number of bytes written.
+    """
     if get_byte_order(array.dtype) == "BigEndian":
         array = array.byteswap()
-    array.tofile(f)
+    data = numpy.ascontiguousarray(array).reshape(-1).view(numpy.uint8)
+    if compress is None:
+        f.write(numpy.uint32(data.nbytes).tobytes())
+        f.write(data)
+        return 4 + data.nbytes
+    # The header is the number of blocks, the block size, the size of
+    # the last block if it is partial (zero otherwise) and the
+    # compressed size of each block.  The compressed sizes are only
+    # known once the blocks are written, so leave room for the header
+    # and fill it in afterwards.
+    nblocks = -(-data.nbytes // block_size)
+    header = numpy.zeros(3 + nblocks, dtype=numpy.uint32)
+    header[:3] = nblocks, block_size, data.nbytes % block_size
+    start = f.tell()
+    f.write(header.tobytes())
+    for n, i in enumerate(range(0, data.nbytes, block_size)):
+        block = compress(data[i:i+block_size])
+        header[3 + n] = len(block)
+        f.write(block)
+    end = f.tell()
+    f.seek(start)
+    f.write(header.tobytes())
+    f.seek(end)
+    return end - start
 
 
 def write_array_descriptor(f, ofunction, offset=None, parallel=False):
@@ -299,7 +361,15 @@ def get_pvtu_name(basename):
     return "%s.pvtu" % basename
 
 
-def get_array(function):
+def get_array(function, out=None):
+    """Get the data of a function, in the shape needed for output.
+
+    :arg function: the :class:`.Function`.
+    :kwarg out: an optional array to copy vector or tensor data into
+        if it needs padding.  This must have been returned by a
+        previous call of this function for a function of the same
+        shape, so that its padding is zero.
+    """
     shape = function.ufl_shape
     # Despite not writing connectivity data in the halo, we need to
     # write data arrays in the halo because the cell node map for
@@ -311,19 +381,236 @@ def get_array(function):
         # Vectors must be padded to three components
         reshape = (-1, ) + shape
         if shape != (3, ):
-            array = numpy.pad(array.reshape(reshape), ((0, 0), (0, 3 - shape[0])),
-                              mode="constant")
+            array = array.reshape(reshape)
+            padded = (array.shape[0], 3)
+            if out is None or out.shape != padded or out.dtype != array.dtype:
+                out = numpy.zeros(padded, dtype=array.dtype)
+            out[:, :shape[0]] = array
+            array = out
     elif len(shape) == 2:
         # Tensors must be padded to 3x3.
         reshape = (-1, ) + shape
         if shape != (3, 3):
-            array = numpy.pad(array.reshape(reshape), ((0, 0), (0, 3 - shape[0]), (0, 3 - shape[1])),
-                              mode="constant")
+            array = array.reshape(reshape)
+            padded = (array.shape[0], 3, 3)
+            if out is None or out.shape != padded or out.dtype != array.dtype:
+                out = numpy.zeros(padded, dtype=array.dtype)
+            out[:, :shape[0], :shape[1]] = array
+            array = out
     else:
         raise ValueError("Can't write data with shape %s" % (shape, ))
     return array
 
 
+def _run_writes(jobs, errors):
+    """Run queued writes in order until a ``None`` job is received.
+
+    After a write fails, subsequent writes are skipped: the error is
+    reported to the main thread by :meth:`_BackgroundWriter.flush`."""
+    while True:
+        job = jobs.get()
+        try:
+            if job is None:
+                return
+            if not errors:
+                job()
+        except Exception as e:
+            errors.append(e)
+        finally:
+            jobs.task_done()
+
+
+class _BackgroundWriter(object):
+    """Performs file writes, in order, on a background thread.
+
+    :arg max_pending: The maximum number of writes waiting to be
+        performed; submitting another one blocks until a write has
+        finished.
+
+    The writes must not make MPI calls, unless MPI was initialised
+    with ``MPI_THREAD_MULTIPLE`` and every process submits the same
+    collective writes in the same order.
+    """
+    def __init__(self, max_pending):
+        if max_pending < 1:
+            raise ValueError("Must allow at least one pending write")
+        self._jobs = queue.Queue(maxsize=max_pending)
+        self._errors = []
+        self._thread = threading.Thread(target=_run_writes,
+                                        args=(self._jobs, self._errors),
+                                        daemon=True)
+        self._thread.start()
+
+    def _check(self):
+        if self._errors:
+            raise self._errors.pop()
+
+    def submit(self, fn, *args):
+        """Queue a call of ``fn(*args)``."""
+        self._check()
+        if not self._thread.is_alive():
+            raise ValueError("Writer has been closed")
+        self._jobs.put(functools.partial(fn, *args))
+
+    def flush(self):
+        """Wait until all queued writes have been performed."""
+        self._jobs.join()
+        self._check()
+
+    def close(self):
+        """Perform all queued writes and stop the background thread."""
+        if self._thread.is_alive():
+            self._jobs.put(None)
+            self._thread.join()
+        self._check()
+
+
+class _VTKHDFWriter(object):
+    """Writes timesteps to a transient VTKHDF file.
+
+    Each process writes its part of the mesh and data, collectively,
+    into the one file.  The mesh topology is only written once, and the
+    coordinates are only written again when they change, so each
+    timestep otherwise consists of just the point data.
+
+    :arg filename: the name of the file.
+    :arg comm: the communicator to write on.
+    :arg mode: ``"w"`` to create a new file, ``"a"`` to append to an
+        existing one.
+    :arg compression: ``None``, or ``"zlib"`` to compress the data.
+    :arg compression_level: the compression level.
+    :arg block_size: the approximate size in bytes of the HDF5 chunks.
+    """
+    def __init__(self, filename, comm, mode, compression, compression_level, block_size):
+        import h5py
+        if compression is None:
+            self._create_args = {}
+            self._chunk_bytes = 2**20
+        elif compression == "zlib":
+            if comm.size > 1:
+                # Parallel HDF5 can only write filtered datasets
+                # collectively, which processes with no data do not do.
+                raise ValueError("Compressed VTKHDF output is only supported in serial")
+            self._create_args = dict(compression="gzip",
+                                     compression_opts=4 if compression_level is None else compression_level)
+            self._chunk_bytes = block_size
+        else:
+            raise ValueError("VTKHDF output only supports zlib compression")
+        self.comm = comm
+        if comm.size > 1:
+            try:
+                self._file = h5py.File(filename, mode, driver="mpio", comm=comm)
+            except NameError:  # the error you get if h5py isn't compiled against parallel HDF5
+                raise RuntimeError("h5py *must* be installed with MPI support")
+        else:
+            self._file = h5py.File(filename, mode)
+        # Offsets of the topology and coordinates written by this
+        # writer.  The topology is written again when appending, since
+        # the number of processes may differ.
+        self._topology_offsets = None
+        self._coordinates = None
+        self._point_offset = None
+        root = self._file.require_group("VTKHDF")
+        if mode == "w":
+            root.attrs["Version"] = numpy.array([2, 0], dtype=numpy.int64)
+            typ = b"UnstructuredGrid"
+            root.attrs.create("Type", typ, dtype=h5py.string_dtype("ascii", len(typ)))
+            root.require_group("Steps").attrs["NSteps"] = 0
+
+    @property
+    def nsteps(self):
+        """The number of timesteps in the file."""
+        return int(self._file["VTKHDF/Steps"].attrs["NSteps"])
+
+    def _append(self, group, name, data, replicated=False):
+        """Collectively append data to a (possibly new) resizable dataset.
+
+        :arg group: the :class:`h5py:Group` holding the dataset.
+        :arg name: the name of the dataset.
+        :arg data: the rows to append, which are placed after those
+            of lower ranks.
+        :arg replicated: if ``True``, the data is the same on every
+            process and is only appended once.
+        :returns: the offset of the appended data in the dataset.
+        """
+        data = numpy.asarray(data)
+        if replicated and self.comm.rank != 0:
+            data = data[:0]
+        counts = self.comm.allgather(data.shape[0])
+        start = sum(counts[:self.comm.rank])
+        shape = (sum(counts), ) + data.shape[1:]
+        if name in group:
+            dset = group[name]
+            offset = dset.shape[0]
+            dset.resize(offset + shape[0], axis=0)
+        else:
+            row_bytes = data.itemsize * int(numpy.prod(data.shape[1:]))
+            chunks = (max(1, self._chunk_bytes // row_bytes), ) + data.shape[1:]
+            dset = group.create_dataset(name, shape=shape, dtype=data.dtype,
+                                        maxshape=(None, ) + data.shape[1:],
+                                        chunks=chunks, **self._create_args)
+            offset = 0
+        if data.shape[0]:
+            dset[offset + start:offset + start + data.shape[0]] = data
+        return offset
+
+    def _write_topology(self, npoints, topology):
+        root = self._file["VTKHDF"]
+        connectivity, offsets, types = (o.array for o in topology)
+        part_offset = self._append(root, "NumberOfPoints", [npoints])
+        self._append(root, "NumberOfCells", [types.shape[0]])
+        self._append(root, "NumberOfConnectivityIds", [connectivity.shape[0]])
+        # Connectivity and offsets are local to each part
+        connectivity_offset = self._append(root, "Connectivity", connectivity.astype(numpy.int64))
+        self._append(root, "Offsets", numpy.concatenate(([0], offsets)).astype(numpy.int64))
+        cell_offset = self._append(root, "Types", types)
+        return part_offset, cell_offset, connectivity_offset
+
+    def write(self, time, coordinates, topology, functions):
+        root = self._file["VTKHDF"]
+        steps = root["Steps"]
+        if self._topology_offsets is None:
+            self._topology_offsets = self._write_topology(coordinates.array.shape[0], topology)
+        part_offset, cell_offset, connectivity_offset = self._topology_offsets
+
+        changed = self._coordinates is None or not numpy.array_equal(coordinates.array, self._coordinates)
+        if self.comm.allreduce(changed):
+            self._point_offset = self._append(root, "Points", coordinates.array)
+            self._coordinates = numpy.array(coordinates.array)
+
+        # Times may be given as integers (and default to the step
+        # number), but the dataset must not take an integer type.
+        self._append(steps, "Values", numpy.array([float(time)], dtype=numpy.float64),
+                     replicated=True)
+        self._append(steps, "PartOffsets", [part_offset], replicated=True)
+        self._append(steps, "NumberOfParts", [self.comm.size], replicated=True)
+        self._append(steps, "PointOffsets", [self._point_offset], replicated=True)
+        self._append(steps, "CellOffsets", [[cell_offset]], replicated=True)
+        self._append(steps, "ConnectivityIdOffsets", [[connectivity_offset]], replicated=True)
+        data = root.require_group("PointData")
+        data_offsets = steps.require_group("PointDataOffsets")
+        for function in functions:
+            array = function.array
+            if len(array.shape) > 2:
+                # Tensors are stored as 9 components
+                array = array.reshape(array.shape[0], -1)
+            offset = self._append(data, function.name, array)
+            self._append(data_offsets, function.name, [offset], replicated=True)
+        steps.attrs["NSteps"] = self.nsteps + 1
+        self._file.flush()
+
+    def close(self):
+        if self._file:
+            self._file.close()
+
+
+def _snapshot(ofunction):
+    """Copy the data of an :class:`OFunction` so that it can be
+    written after the function has changed."""
+    return OFunction(array=numpy.array(ofunction.array), name=ofunction.name,
+                     function=None)
+
+
 class File(object):
     _header = (b'<?xml version="1.0" ?>\n'
                b'<VTKFile type="Collection" version="0.1" '
@@ -333,15 +620,22 @@ class File(object):
                b'</VTKFile>\n')
 
     def __init__(self, filename, project_output=False, comm=None, mode="w",
-                 target_degree=None, target_continuity=None):
+                 target_degree=None, target_continuity=None,
+                 asynchronous=False, max_pending_writes=2,
+                 compression=None, compression_level=None,
+                 compression_block_size=2**15):
         """Create an object for outputting data for visualisation.
 
         This produces output in VTU format, suitable for visualisation
         with Paraview or other VTK-capable visualisation packages.
 
+        Alternatively, if the file name ends in ``.vtkhdf``, all
+        timesteps from all processes are written into a single VTKHDF
+        file (which needs Paraview 5.12 or later), storing the mesh
+        only once rather than with every timestep.
 
         :arg filename: The name of the output file (must end in
-            ``.pvd``).
+            ``.pvd`` or ``.vtkhdf``).
         :kwarg project_output: Should the output be projected to
             a computed output space?  Default is to use interpolation.
         :kwarg comm: The MPI communicator to use.
@@ -350,6 +644,20 @@ class File(object):
         :kwarg target_continuity: override the continuity of the output space;
             A UFL :class:`~.SobolevSpace` object: `H1` for a
             continuous output and `L2` for a discontinuous output.
+        :kwarg asynchronous: write the files on a background thread.
+            The data is copied when :meth:`write` is called, so the
+            functions may be modified straight away.  Call
+            :meth:`flush` to wait for the files to be written.
+        :kwarg max_pending_writes: with ``asynchronous=True``, the
+            maximum number of timesteps waiting to be written before
+            :meth:`write` blocks.
+        :kwarg compression: compress the data in the VTU files, with
+            ``"zlib"`` or ``"lz4"`` (which requires the lz4 package).
+            VTKHDF files only support ``"zlib"``.
+        :kwarg compression_level: the compression level to use
+            (0-9 for zlib, 1-16 for lz4), or ``None`` for the default.
+        :kwarg compression_block_size: the size in bytes of the blocks
+            the data are compressed in.
 
         .. note::
 
@@ -360,8 +668,8 @@ class File(object):
         """
         filename = os.path.abspath(filename)
         basename, ext = os.path.splitext(filename)
-        if ext not in (".pvd", ):
-            raise ValueError("Only output to PVD is supported")
+        if ext not in (".pvd", ".vtkhdf"):
+            raise ValueError("Only output to PVD or VTKHDF is supported")
 
         if mode not in ["w", "a"]:
             raise ValueError("Mode must be 'a' or 'w'")
@@ -391,23 +699,34 @@ class File(object):
             raise ValueError("target_continuity must be either 'H1' or 'L2'.")
         countstart = 0
 
-        if self.comm.rank == 0 and mode == "w":
-            with open(self.filename, "wb") as f:
-                f.write(self._header)
-                f.write(self._footer)
-        elif self.comm.rank == 0 and mode == "a":
-            import xml.etree.ElementTree as ET
-            tree = ET.parse(os.path.abspath(filename))
-            # Count how many the file already has
-            for parent in tree.iter():
-                for child in list(parent):
-                    if child.tag != "DataSet":
-                        continue
-                    countstart += 1
-
-        if mode == "a":
-            # Need to communicate the count across all cores involved; default op is SUM
-            countstart = self.comm.allreduce(countstart)
+        if ext == ".vtkhdf":
+            if asynchronous:
+                raise ValueError("Asynchronous output is not supported for VTKHDF files")
+            self._vtkhdf = _VTKHDFWriter(filename, self.comm, mode, compression,
+                                         compression_level, compression_block_size)
+            weakref.finalize(self, self._vtkhdf.close)
+            countstart = self._vtkhdf.nsteps
+            # The data are compressed by HDF5
+            compression = None
+        else:
+            self._vtkhdf = None
+            if self.comm.rank == 0 and mode == "w":
+                with open(self.filename, "wb") as f:
+                    f.write(self._header)
+                    f.write(self._footer)
+            elif self.comm.rank == 0 and mode == "a":
+                import xml.etree.ElementTree as ET
+                tree = ET.parse(os.path.abspath(filename))
+                # Count how many the file already has
+                for parent in tree.iter():
+                    for child in list(parent):
+                        if child.tag != "DataSet":
+                            continue
+                        countstart += 1
+
+            if mode == "a":
+                # Need to communicate the count across all cores involved; default op is SUM
+                countstart = self.comm.allreduce(countstart)
 
         self.counter = itertools.count(countstart)
         self.timestep = itertools.count(countstart)
@@ -416,6 +735,31 @@ class File(object):
         self._topology = None
         self._output_functions = weakref.WeakKeyDictionary()
         self._mappers = weakref.WeakKeyDictionary()
+        # Arrays vectors and tensors are padded into, reused on every write
+        self._padded = weakref.WeakKeyDictionary()
+
+        if compression is None:
+            self._compressor = None
+            self._compress = None
+        else:
+            self._compressor, self._compress = get_compressor(compression, compression_level)
+            if compression_block_size < 1:
+                raise ValueError("Invalid compression_block_size")
+        self._block_size = compression_block_size
+
+        self._closed = False
+        if asynchronous:
+            self._writer = _BackgroundWriter(max_pending_writes)
+            # Make sure queued writes are done before exit
+            weakref.finalize(self, self._writer.close)
+        else:
+            self._writer = None
+
+    def _get_array(self, function):
+        array = get_array(function, out=self._padded.get(function))
+        if array.shape[1:] != function.ufl_shape:
+            self._padded[function] = array
+        return array
 
     def _prepare_output(self, function, max_elem):
         from firedrake import FunctionSpace, VectorFunctionSpace, \
@@ -425,7 +769,7 @@ class File(object):
         # Need to project/interpolate?
         # If space is not the max element, we can do so.
         if function.ufl_element == max_elem:
-            return OFunction(array=get_array(function),
+            return OFunction(array=self._get_array(function),
                              name=name, function=function)
         #  OK, let's go and do it.
         shape = function.ufl_shape
@@ -462,9 +806,9 @@ class File(object):
                 self._mappers[function] = interpolator
             interpolator.interpolate()
 
-        return OFunction(array=get_array(output), name=name, function=output)
+        return OFunction(array=self._get_array(output), name=name, function=output)
 
-    def _write_vtu(self, *functions):
+    def _prepare_vtu(self, *functions):
         from firedrake.function import Function
 
         # Check if the user has requested to write out a plain mesh
@@ -512,7 +856,9 @@ class File(object):
             self._topology = get_topology(coordinates.function)
 
         basename = "%s_%s" % (self.basename, next(self.counter))
+        return basename, coordinates, functions
 
+    def _write_vtu(self, basename, coordinates, *functions):
         vtu = self._write_single_vtu(basename, coordinates, *functions)
 
         if self.comm.size > 1:
@@ -527,31 +873,48 @@ class File(object):
         num_points = coordinates.array.shape[0]
         num_cells = types.array.shape[0]
         fname = get_vtu_name(basename, self.comm.rank, self.comm.size)
+        arrays = (coordinates, connectivity, offsets, types) + functions
+        # The descriptors need the size of each array in the appended
+        # data.  A raw array is its size followed by the data, but
+        # compressed sizes are only known once the arrays are encoded,
+        # so compressed arrays are staged in a temporary file and
+        # copied to the end of the output.
+        if self._compress is None:
+            staged = None
+            sizes = [4 + o.array.nbytes for o in arrays]
+        else:
+            staged = tempfile.TemporaryFile(dir=os.path.dirname(os.path.abspath(fname)))
+            sizes = [write_encoded_array(staged, o.array, self._compress, self._block_size)
+                     for o in arrays]
+        # Offsets of each array in the appended data, in the order
+        # the descriptors are written.
+        starts = itertools.accumulate([0] + sizes)
         with open(fname, "wb") as f:
-            # Running offset for appended data
-            offset = 0
             f.write(b'<?xml version="1.0" ?>\n')
             f.write(b'<VTKFile type="UnstructuredGrid" version="0.1" '
                     b'byte_order="LittleEndian" '
-                    b'header_type="UInt32">\n')
+                    b'header_type="UInt32"')
+            if self._compressor is not None:
+                f.write((' compressor="%s"' % self._compressor).encode('ascii'))
+            f.write(b'>\n')
             f.write(b'<UnstructuredGrid>\n')
 
             f.write(('<Piece NumberOfPoints="%d" '
                      'NumberOfCells="%d">\n' % (num_points, num_cells)).encode('ascii'))
             f.write(b'<Points>\n')
             # Vertex coordinates
-            offset += write_array_descriptor(f, coordinates, offset=offset)
+            write_array_descriptor(f, coordinates, offset=next(starts))
             f.write(b'</Points>\n')
 
             f.write(b'<Cells>\n')
-            offset += write_array_descriptor(f, connectivity, offset=offset)
-            offset += write_array_descriptor(f, offsets, offset=offset)
-            offset += write_array_descriptor(f, types, offset=offset)
+            write_array_descriptor(f, connectivity, offset=next(starts))
+            write_array_descriptor(f, offsets, offset=next(starts))
+            write_array_descriptor(f, types, offset=next(starts))
             f.write(b'</Cells>\n')
 
             f.write(b'<PointData%s>\n' % active_field_attributes(functions))
             for function in functions:
-                offset += write_array_descriptor(f, function, offset=offset)
+                write_array_descriptor(f, function, offset=next(starts))
             f.write(b'</PointData>\n')
 
             f.write(b'</Piece>\n')
@@ -561,12 +924,13 @@ class File(object):
             # Appended data must start with "_", separating whitespace
             # from data
             f.write(b'_')
-            write_array(f, coordinates)
-            write_array(f, connectivity)
-            write_array(f, offsets)
-            write_array(f, types)
-            for function in functions:
-                write_array(f, function)
+            if staged is None:
+                for o in arrays:
+                    write_encoded_array(f, o.array)
+            else:
+                with staged:
+                    staged.seek(0)
+                    shutil.copyfileobj(staged, f)
             f.write(b'\n</AppendedData>\n')
 
             f.write(b'</VTKFile>\n')
@@ -620,11 +984,25 @@ class File(object):
         However, all calls to :meth:`write` must use the same set of
         functions.
         """
+        if self._closed:
+            raise ValueError("Cannot write to a closed File")
         time = kwargs.get("time", None)
-        vtu = self._write_vtu(*functions)
+        basename, coordinates, functions = self._prepare_vtu(*functions)
         if time is None:
             time = next(self.timestep)
 
+        if self._vtkhdf is not None:
+            self._vtkhdf.write(time, coordinates, self._topology, functions)
+        elif self._writer is None:
+            self._write_timestep(basename, time, coordinates, *functions)
+        else:
+            self._writer.submit(self._write_timestep, basename, time,
+                                _snapshot(coordinates),
+                                *map(_snapshot, functions))
+
+    def _write_timestep(self, basename, time, coordinates, *functions):
+        vtu = self._write_vtu(basename, coordinates, *functions)
+
         # Write into collection as relative path, so we can move
         # things around.
         vtu = os.path.relpath(vtu, os.path.dirname(self.basename))
@@ -637,3 +1015,31 @@ class File(object):
                          'file="%s" />\n' % (time, vtu)).encode('ascii'))
                 # And add footer again, so that the file is valid
                 f.write(self._footer)
+
+    def flush(self):
+        """Wait until all data passed to :meth:`write` is on disk.
+
+        This is collective over the communicator of this
+        :class:`File`, and does nothing unless it was created with
+        ``asynchronous=True``."""
+        if self._writer is not None:
+            try:
+                self._writer.flush()
+            finally:
+                self.comm.barrier()
+        if self._vtkhdf is not None:
+            self._vtkhdf._file.flush()
+
+    def close(self):
+        """Finish writing and close this :class:`File`.
+
+        Like :meth:`flush`, this is collective.  No more data may be
+        written afterwards."""
+        self._closed = True
+        if self._vtkhdf is not None:
+            self._vtkhdf.close()
+        if self._writer is not None:
+            try:
+                self._writer.close()
+            finally:
+                self.comm.barrier()
@@ -77,6 +77,17 @@ parameters.add(Parameters("form_compiler", **default_parameters()))
 
 parameters["reorder_meshes"] = True
 
+# Number of processes used to compile the blocks of a split form
+# concurrently (1 compiles them serially).  The processes are forked
+# after MPI is initialised, which some MPI implementations do not
+# support: the FIREDRAKE_TSFC_DISABLE_FORK environment variable
+# disables this.
+parameters["form_compiler_processes"] = 1
+
+# Read kernels from the disk cache on one rank per node, rather than
+# one rank per communicator, and store them without synchronising
+parameters["node_local_kernel_cache"] = False
+
 # One of nest, aij, baij or matfree
 parameters["default_matrix_type"] = "nest"
 # One of aij or baij
@@ -84,6 +95,13 @@ parameters["default_sub_matrix_type"] = "baij"
 
 parameters["type_check_safe_par_loops"] = False
 
+# Number of threads used by each process to assemble 1-forms (1
+# assembles serially)
+parameters["assembly_threads"] = 1
+
+# One of rtree or grid
+parameters["spatial_index"] = "rtree"
+
 
 def disable_performance_optimisations():
     """Switches off performance optimisations in Firedrake.
@@ -1,4 +1,6 @@
 
+import numpy
+
 from pyop2.datatypes import IntType, as_cstr
 
 from coffee import base as ast
@@ -111,10 +113,12 @@ def compile_element(expression, coordinates, parameters=None):
 
     code = {
         "geometric_dimension": cell.geometric_dimension(),
+        "topological_dimension": cell.topological_dimension(),
         "layers_arg": ", int const *__restrict__ layers" if extruded else "",
         "layers": ", layers" if extruded else "",
         "IntType": as_cstr(IntType),
         "scalar_type": utils.ScalarType_c,
+        "value_size": numpy.prod(expression.ufl_shape, dtype=int),
     }
     # if maps are the same, only need to pass one of them
     if coordinates.cell_node_map() == coefficient.cell_node_map():
@@ -149,6 +153,35 @@ int evaluate(struct Function *f, %(scalar_type)s *x, %(scalar_type)s *result)
     wrap_evaluate(result, reference_coords.X, cell, cell+1%(layers)s, f->coords, f->f, %(map_args)s);
     return 0;
 }
+
+int evaluate_points(struct Function *f, %(scalar_type)s *x, int npoints, %(scalar_type)s *result, int *found)
+{
+    int nfound = 0;
+    for (int p = 0; p < npoints; p++) {
+        found[p] = evaluate(f, x + p*%(geometric_dimension)d, result + p*%(value_size)d) == 0;
+        nfound += found[p];
+    }
+    return nfound;
+}
+
+int evaluate_reference_points(struct Function *f, int npoints, int *cells, double *X, %(scalar_type)s *result)
+{
+    for (int p = 0; p < npoints; p++) {
+        %(IntType)s cell = cells[p];
+        if (cell == -1) {
+            continue;
+        }
+        int layers[2] = {0, 0};
+        if (f->extruded != 0) {
+            int nlayers = f->n_layers;
+            layers[1] = cell %% nlayers + 2;
+            cell = cell / nlayers;
+        }
+
+        wrap_evaluate(result + p*%(value_size)d, X + p*%(topological_dimension)d, cell, cell+1%(layers)s, f->coords, f->f, %(map_args)s);
+    }
+    return 0;
+}
 """
 
     return (evaluate_template_c % code) + kernel_code.gencode()
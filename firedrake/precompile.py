@@ -0,0 +1,112 @@
+import ufl
+
+from pyop2 import op2
+from pyop2.profiling import timed_function
+
+from firedrake.assemble import _assemble
+from firedrake.interpolation import make_interpolator
+from firedrake.slate import slate
+from firedrake.variational_solver import NonlinearVariationalProblem
+
+__all__ = ["precompile"]
+
+
+def _compile_loops(loops, compiled):
+    """Compile (but do not execute) the par_loops among some assembly thunks.
+
+    :arg loops: An iterable of callables, as produced by
+        :func:`~.assemble._assemble` or :func:`~.interpolation.make_interpolator`.
+    :arg compiled: A dict of the kernels compiled so far, which is
+        updated.
+    """
+    for loop in loops:
+        try:
+            jitmodule = loop.__self__._jitmodule
+        except AttributeError:
+            # Zeroing, boundary conditions, matrix assembly or python
+            # kernels: nothing to compile.
+            continue
+        if id(jitmodule) not in compiled:
+            jitmodule.compile()
+            compiled[id(jitmodule)] = jitmodule
+
+
+def _problem_forms(problem):
+    forms = [problem.F, problem.J]
+    if not problem.Jp_eq_J:
+        forms.append(problem.Jp)
+    return forms
+
+
+@timed_function("Precompile")
+def precompile(forms=(), interpolations=(), point_evaluations=(),
+               form_compiler_parameters=None, mat_type=None, sub_mat_type=None):
+    r"""Generate and compile the kernels a simulation will need, without
+    executing them.
+
+    This populates both the TSFC kernel cache and the PyOP2 compiled
+    code cache on disk, so that a subsequent run (for example a large
+    parallel job) does not spend its time in code generation and the C
+    compiler.  Since the generated code does not depend on the size of
+    the mesh, it is sufficient (and much cheaper) to precompile using a
+    small mesh with the same cell type and function spaces.
+
+    :kwarg forms: An iterable of UFL :class:`~ufl.classes.Form`\s or
+        Slate tensors that will be assembled, or of
+        :class:`.NonlinearVariationalProblem`\s (or
+        :class:`.LinearVariationalProblem`\s) that will be solved.
+    :kwarg interpolations: An iterable of ``(expr, V)`` pairs that will
+        be interpolated (see :func:`.interpolate`).
+    :kwarg point_evaluations: An iterable of :class:`.Function`\s that
+        will be evaluated at points.  The code to locate points in
+        their meshes is compiled too.
+    :kwarg form_compiler_parameters: Optional parameters to pass to the
+        form compiler (ignored for variational problems, which carry
+        their own).
+    :kwarg mat_type: The matrix type bilinear forms will be assembled
+        into (see :func:`.assemble`).
+    :kwarg sub_mat_type: The matrix type of blocks of ``"nest"``
+        matrices.
+    :returns: The number of distinct kernels, including those which
+        were already in the disk cache (and so just loaded).
+    """
+    jobs = []
+    for form in forms:
+        if isinstance(form, NonlinearVariationalProblem):
+            jobs.extend((f, form.bcs, form.form_compiler_parameters)
+                        for f in _problem_forms(form))
+        elif isinstance(form, (ufl.Form, slate.TensorBase)):
+            jobs.append((form, None, form_compiler_parameters))
+        else:
+            raise TypeError("Unable to precompile %r" % form)
+
+    compiled = {}
+    for form, bcs, fc_params in jobs:
+        if len(form.arguments()) == 2 and mat_type == "matfree":
+            continue
+        _compile_loops(_assemble(form, bcs=bcs,
+                                 form_compiler_parameters=fc_params,
+                                 mat_type=mat_type,
+                                 sub_mat_type=sub_mat_type), compiled)
+
+    for expr, V in interpolations:
+        interpolator, _ = make_interpolator(expr, V, None, op2.WRITE)
+        loops, _ = interpolator.args
+        _compile_loops(loops, compiled)
+
+    for function in point_evaluations:
+        mesh = function.ufl_domain()
+        if ("locator", id(mesh)) not in compiled:
+            # Used by Mesh.locate_cells (and point evaluation) and
+            # Mesh.locate_cell respectively.
+            compiled["locator", id(mesh)] = mesh._c_reference_locator()
+            compiled["cell_locator", id(mesh)] = mesh._c_locator()
+        for f in function.split():
+            # The code only depends on the mesh and element, so is
+            # the same for (e.g.) the components of a mixed function.
+            key = (id(mesh), f.function_space().ufl_element())
+            if ("evaluate", ) + key not in compiled:
+                # Used by Function.at and PointEvaluator respectively.
+                compiled[("evaluate", ) + key] = f._c_evaluate_points()
+                compiled[("evaluate_reference", ) + key] = f._c_evaluate_reference_points
+    return len(compiled)
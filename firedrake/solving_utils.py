@@ -3,6 +3,7 @@ import numpy
 import itertools
 
 from pyop2 import op2
+from pyop2.mpi import MPI
 from firedrake import function, dmhooks
 from firedrake.exceptions import ConvergenceError
 from firedrake.petsc import PETSc
@@ -69,6 +70,13 @@ class _SNESContext(object):
     :arg options_prefix: The options prefix of the SNES.
     :arg transfer_manager: Object that can transfer functions between
         levels, typically a :class:`~.TransferManager`
+    :arg fused_assembly: If ``True``, assemble the Jacobian along with
+        the residual, in the same par_loops (see
+        :func:`~.assemble.create_fused_assembly_callable`), into a
+        separate matrix, which is copied into the Jacobian if that is
+        then requested at the same state.  Ignored if a
+        ``pre_jacobian_callback`` is given, since that must see the
+        state the Jacobian is assembled at.
 
     The idea here is that the SNES holds a shell DM which contains
     this object as "user context".  When the SNES calls back to the
@@ -80,7 +88,8 @@ class _SNESContext(object):
                  pre_jacobian_callback=None, pre_function_callback=None,
                  post_jacobian_callback=None, post_function_callback=None,
                  options_prefix=None,
-                 transfer_manager=None):
+                 transfer_manager=None,
+                 fused_assembly=False):
         from firedrake.assemble import create_assembly_callable
         from firedrake.bcs import DirichletBC
         if pmat_type is None:
@@ -141,6 +150,17 @@ class _SNESContext(object):
                                                            form_compiler_parameters=self.fcp)
 
         self._jacobian_assembled = False
+        # The Jacobian cannot be fused with the residual if it is
+        # matrix-free, and need not be if it is constant.  Residuals
+        # are also evaluated at states which the Jacobian is never
+        # requested at (e.g. in line searches), so the pre Jacobian
+        # callback must not be called with them.
+        self._fused_assembly = (fused_assembly and not matfree
+                                and not problem._constant_jacobian
+                                and pre_jacobian_callback is None)
+        # The state at which the Jacobian was last assembled along
+        # with the residual, if it has not been used yet.
+        self._fused_state = None
         self._splits = {}
         self._coarse = None
         self._fine = None
@@ -314,7 +334,11 @@ class _SNESContext(object):
         if ctx._pre_function_callback is not None:
             ctx._pre_function_callback(X)
 
-        ctx._assemble_residual()
+        if ctx._fused_assembly:
+            ctx._assemble_residual_and_jac()
+            ctx._fused_state = X.array_r.copy()
+        else:
+            ctx._assemble_residual()
 
         if ctx._post_function_callback is not None:
             with ctx._F.dat.vec as F_:
@@ -350,10 +374,15 @@ class _SNESContext(object):
         with ctx._x.dat.vec_wo as v:
             X.copy(v)
 
-        if ctx._pre_jacobian_callback is not None:
-            ctx._pre_jacobian_callback(X)
+        if ctx._fused_jacobian_current(X):
+            # Assembled along with the residual at X.
+            ctx._fused_jac.petscmat.copy(ctx._jac.petscmat,
+                                         structure=PETSc.Mat.Structure.SAME_NONZERO_PATTERN)
+        else:
+            if ctx._pre_jacobian_callback is not None:
+                ctx._pre_jacobian_callback(X)
 
-        ctx._assemble_jac()
+            ctx._assemble_jac()
 
         if ctx._post_jacobian_callback is not None:
             ctx._post_jacobian_callback(X, J)
@@ -419,6 +448,40 @@ class _SNESContext(object):
                                         form_compiler_parameters=self.fcp,
                                         mat_type=self.mat_type)
 
+    @cached_property
+    def _fused_jac(self):
+        # The Jacobian assembled along with the residual.  This is not
+        # _jac, which the solver may still be using: the residual is
+        # also evaluated at trial states, and the Jacobian may be
+        # lagged.
+        from firedrake.assemble import allocate_matrix
+        return allocate_matrix(self.J,
+                               bcs=self.bcs_J,
+                               form_compiler_parameters=self.fcp,
+                               mat_type=self.mat_type,
+                               appctx=self.appctx)
+
+    @cached_property
+    def _assemble_residual_and_jac(self):
+        from firedrake.assemble import create_fused_assembly_callable
+        return create_fused_assembly_callable([self.F, self.J],
+                                              [self._F, self._fused_jac],
+                                              bcs=[self.bcs_F, self.bcs_J],
+                                              form_compiler_parameters=self.fcp,
+                                              mat_type=self.mat_type)
+
+    def _fused_jacobian_current(self, X):
+        r"""Was the Jacobian assembled, along with the residual, at the
+        state X (and not used since)?
+
+        :arg X: The current guess (a Vec).
+        """
+        if not self._fused_assembly:
+            return False
+        state, self._fused_state = self._fused_state, None
+        current = state is not None and numpy.array_equal(state, X.array_r)
+        return X.comm.tompi4py().allreduce(current, op=MPI.LAND)
+
     @cached_property
     def is_mixed(self):
         return self._jac.block_shape != (1, 1)
@@ -1,5 +1,6 @@
 """Provides the interface to TSFC for compiling a form, and transforms the TSFC-
 generated code in order to make it suitable for passing to the backends."""
+import copy
 import pickle
 
 from hashlib import md5
@@ -9,6 +10,9 @@ import os
 import zlib
 import tempfile
 import collections
+import multiprocessing
+import socket
+import time
 
 import ufl
 from ufl import Form
@@ -19,11 +23,12 @@ from tsfc.parameters import PARAMETERS as tsfc_default_parameters
 
 from pyop2.caching import Cached
 from pyop2.op2 import Kernel
-from pyop2.mpi import COMM_WORLD
+from pyop2.mpi import COMM_WORLD, MPI
 
 from coffee.base import Invert
 
 from firedrake.formmanipulation import split_form
+from firedrake_configuration.cache import parse_size, cache_entries, prune_cachedir
 
 from firedrake.parameters import parameters as default_parameters
 from firedrake import utils
@@ -46,21 +51,60 @@ KernelInfo = collections.namedtuple("KernelInfo",
                                      "needs_cell_sizes"])
 
 
-class TSFCKernel(Cached):
-
-    _cache = {}
+class DiskCached(Cached):
+    """Base class for objects cached in memory and, in pickled form,
+    in the Firedrake TSFC kernel cache directory."""
 
     _cachedir = environ.get('FIREDRAKE_TSFC_KERNEL_CACHE_DIR',
                             path.join(tempfile.gettempdir(),
                                       'firedrake-tsfc-kernel-cache-uid%d' % getuid()))
 
+    _max_cache_size = (parse_size(environ['FIREDRAKE_TSFC_KERNEL_CACHE_MAX_SIZE'])
+                       if 'FIREDRAKE_TSFC_KERNEL_CACHE_MAX_SIZE' in environ else None)
+    """Maximum size in bytes of the disk cache, or ``None`` for no limit."""
+
+    _disk_size = None
+    """Running estimate of the size of the disk cache (on rank 0)."""
+
     @classmethod
     def _cache_lookup(cls, key):
         key, comm = key
-        return cls._cache.get(key) or cls._read_from_disk(key, comm)
+        val = cls._cache.get(key)
+        if val is not None:
+            cls._stats["memory_hits"] += 1
+            return val
+        try:
+            val = cls._read_from_disk(key, comm)
+        except KeyError:
+            cls._stats["misses"] += 1
+            raise
+        cls._stats["disk_hits"] += 1
+        return val
+
+    @classmethod
+    def _load(cls, key, comm):
+        """Load the object with the given key into the memory cache,
+        if it is only on disk.
+
+        :returns: ``True`` if the object is now in the memory cache,
+            where lookups then find it.
+        """
+        if key in cls._cache:
+            return True
+        try:
+            cls._cache[key] = cls._read_from_disk(key, comm)
+        except KeyError:
+            return False
+        cls._stats["disk_hits"] += 1
+        return True
 
     @classmethod
     def _read_from_disk(cls, key, comm):
+        if default_parameters["node_local_kernel_cache"]:
+            # One rank per node reads the file and shares it over the
+            # node-local communicator, so lookups do not synchronise
+            # the whole of comm.
+            comm = _node_comm(comm)
         if comm.rank == 0:
             cache = cls._cachedir
             shard, disk_key = key[:2], key[2:]
@@ -70,7 +114,9 @@ class TSFCKernel(Cached):
                 try:
                     with gzip.open(filepath, 'rb') as f:
                         val = f.read()
-                except zlib.error:
+                    # Record the access for least recently used eviction
+                    os.utime(filepath)
+                except (zlib.error, OSError):
                     pass
 
             comm.bcast(val, root=0)
@@ -85,25 +131,85 @@ class TSFCKernel(Cached):
     def _cache_store(cls, key, val):
         key, comm = key
         cls._cache[key] = val
-        _ensure_cachedir(comm=comm)
-        if comm.rank == 0:
+        node_local = default_parameters["node_local_kernel_cache"]
+        if node_local:
+            # Every node writes its own copy, so that this also works
+            # when the cache directory is on node-local storage.
+            writer = _node_comm(comm).rank == 0
+        else:
+            _ensure_cachedir(comm=comm)
+            writer = comm.rank == 0
+        if writer:
             val._key = key
             shard, disk_key = key[:2], key[2:]
             filepath = os.path.join(cls._cachedir, shard, disk_key)
-            tempfile = os.path.join(cls._cachedir, shard, "%s_p%d.tmp" % (disk_key, os.getpid()))
-            # No need for a barrier after this, since non root
-            # processes will never race on this file.
+            tempfile = os.path.join(cls._cachedir, shard, "%s_%s_p%d.tmp" % (disk_key, socket.gethostname(), os.getpid()))
             os.makedirs(os.path.join(cls._cachedir, shard), exist_ok=True)
             with gzip.open(tempfile, 'wb') as f:
-                pickle.dump(val, f, 0)
+                pickle.dump(val, f, pickle.HIGHEST_PROTOCOL)
+            # The rename is atomic, so readers either see the complete
+            # file or no file at all.
             os.rename(tempfile, filepath)
-        comm.barrier()
+            if cls._max_cache_size is not None:
+                if DiskCached._disk_size is None:
+                    DiskCached._disk_size = cache_usage()[1]
+                else:
+                    DiskCached._disk_size += os.path.getsize(filepath)
+                if DiskCached._disk_size > cls._max_cache_size:
+                    # Leave some headroom so we do not prune on every store
+                    _prune_cachedir(int(0.9 * cls._max_cache_size))
+        if not node_local:
+            comm.barrier()
+
+
+class TSFCKernelTree(DiskCached):
+
+    _cache = {}
+
+    _stats = collections.Counter()
+
+    @classmethod
+    def _cache_key(cls, form, name, parameters, interface, coffee=False, diagonal=False, tree=None):
+        return md5((form.signature() + name
+                    + str(sorted(parameters.items()))
+                    + str(type(interface))
+                    + str(coffee)
+                    + str(diagonal)).encode()).hexdigest(), form.ufl_domains()[0].comm
+
+    def __init__(self, form, name, parameters, interface, coffee=False, diagonal=False, tree=None):
+        """The kernels generated by TSFC for a given :class:`~ufl.classes.Form`,
+        before any COFFEE optimisations are applied.
+
+        :arg form: the :class:`~ufl.classes.Form` from which to compile the kernels.
+        :arg name: a prefix to be applied to the compiled kernel names.
+        :arg parameters: a dict of parameters to pass to the form compiler.
+        :arg interface: the KernelBuilder interface for TSFC (may be None)
+        :arg tree: the kernels already compiled by TSFC for this form
+            (optional, see :func:`_compile_concurrently`).
+        """
+        if self._initialized:
+            return
+
+        coffee = coffee or parameters.get("assemble_inverse", False)
+        if tree is None:
+            start = time.time()
+            tree = tsfc_compile_form(form, prefix=name, parameters=parameters, interface=interface, coffee=coffee, diagonal=diagonal)
+            self._stats["compile_time"] += time.time() - start
+            self._stats["compilations"] += 1
+        self.tree = tree
+        self._initialized = True
+
+
+class TSFCKernel(DiskCached):
+
+    _cache = {}
+
+    _stats = collections.Counter()
 
     @classmethod
     def _cache_key(cls, form, name, parameters, number_map, interface, coffee=False, diagonal=False):
-        # FIXME Making the COFFEE parameters part of the cache key causes
-        # unnecessary repeated calls to TSFC when actually only the kernel code
-        # needs to be regenerated
+        # The TSFC output is cached separately (see TSFCKernelTree),
+        # so changing the COFFEE parameters only regenerates the code
         return md5((form.signature() + name
                     + str(sorted(default_parameters["coffee"].items()))
                     + str(sorted(parameters.items()))
@@ -125,13 +231,16 @@ class TSFCKernel(Cached):
             return
 
         assemble_inverse = parameters.get("assemble_inverse", False)
-        coffee = coffee or assemble_inverse
-        tree = tsfc_compile_form(form, prefix=name, parameters=parameters, interface=interface, coffee=coffee, diagonal=diagonal)
+        tree = TSFCKernelTree(form, name, parameters, interface, coffee, diagonal).tree
         kernels = []
         for kernel in tree:
             # Set optimization options
             opts = default_parameters["coffee"]
             ast = kernel.ast
+            if coffee or assemble_inverse:
+                # COFFEE transforms the AST in place, so keep the
+                # cached tree pristine.  Loopy kernels are immutable.
+                ast = copy.deepcopy(ast)
             ast = ast if not assemble_inverse else _inverse(ast)
             # Unwind coefficient numbering
             numbers = tuple(number_map[c] for c in kernel.coefficient_numbers)
@@ -214,13 +323,21 @@ def compile_form(form, name, parameters=None, inverse=False, split=True, interfa
             assert nargs == 2
             nargs = 1
         iterable = ([(0, )*nargs, form], )
+    blocks = []
     for idx, f in iterable:
         f = _real_mangle(f)
         # Map local coefficient numbers (as seen inside the
         # compiler) to the global coefficient numbers
         number_map = dict((n, coefficient_numbers[c])
                           for (n, c) in enumerate(f.coefficients()))
-        kinfos = TSFCKernel(f, name + "".join(map(str, idx)), parameters,
+        blocks.append((idx, f, name + "".join(map(str, idx)), number_map))
+
+    nprocs = default_parameters["form_compiler_processes"]
+    if nprocs > 1 and len(blocks) > 1 and not _disable_fork:
+        _compile_concurrently(blocks, parameters, interface, coffee, diagonal, nprocs)
+
+    for idx, f, kernel_name, number_map in blocks:
+        kinfos = TSFCKernel(f, kernel_name, parameters,
                             number_map, interface, coffee, diagonal).kernels
         for kinfo in kinfos:
             kernels.append(SplitKernel(idx, kinfo))
@@ -228,6 +345,71 @@ def compile_form(form, name, parameters=None, inverse=False, split=True, interfa
     return cache.setdefault(key, kernels)
 
 
+_disable_fork = "FIREDRAKE_TSFC_DISABLE_FORK" in environ
+"""Never fork processes to compile forms concurrently (see
+:func:`_compile_concurrently`)."""
+
+_pending_compilations = None
+"""The arguments for TSFC of the forms being compiled by
+:func:`_compile_concurrently`, inherited by the forked workers."""
+
+
+def _compile_pending(i):
+    form, name, parameters, interface, coffee, diagonal = _pending_compilations[i]
+    return tsfc_compile_form(form, prefix=name, parameters=parameters, interface=interface, coffee=coffee, diagonal=diagonal)
+
+
+def _compile_concurrently(blocks, parameters, interface, coffee, diagonal, nprocs):
+    """Compile the kernels for the blocks of a split form which are
+    not already cached using a pool of processes.
+
+    The forms are compiled by processes forked from rank 0, so they
+    never need to be pickled (they refer to meshes and functions,
+    which cannot be); the resulting kernels are broadcast and then
+    inserted into the cache, in block order, on every rank.
+
+    Forking after MPI has been initialised is not supported by all MPI
+    implementations (e.g. Open MPI with some transports).  Setting the
+    environment variable ``FIREDRAKE_TSFC_DISABLE_FORK`` disables this,
+    whatever the value of ``parameters["form_compiler_processes"]``.
+
+    :arg blocks: a list of ``(indices, form, name, number_map)`` tuples.
+    :arg nprocs: the maximum number of processes to compile with.
+    """
+    global _pending_compilations
+
+    todo = []
+    for i, block in enumerate(blocks):
+        _, f, kernel_name, number_map = block
+        key, comm = TSFCKernel._cache_key(f, kernel_name, parameters, number_map, interface, coffee, diagonal)
+        tree_key, _ = TSFCKernelTree._cache_key(f, kernel_name, parameters, interface, coffee, diagonal)
+        if not (TSFCKernel._load(key, comm) or TSFCKernelTree._load(tree_key, comm)):
+            todo.append(i)
+    if default_parameters["node_local_kernel_cache"]:
+        # Different nodes may disagree about what is cached, rank 0 decides.
+        todo = comm.bcast(todo, root=0)
+    todo = [blocks[i] for i in todo]
+    if not todo:
+        return
+
+    coffee_ = coffee or parameters.get("assemble_inverse", False)
+    trees = None
+    if comm.rank == 0:
+        start = time.time()
+        _pending_compilations = [(f, kernel_name, parameters, interface, coffee_, diagonal)
+                                 for _, f, kernel_name, _ in todo]
+        try:
+            with multiprocessing.get_context("fork").Pool(min(nprocs, len(todo))) as pool:
+                trees = pool.map(_compile_pending, range(len(todo)))
+        finally:
+            _pending_compilations = None
+        TSFCKernelTree._stats["compile_time"] += time.time() - start
+        TSFCKernelTree._stats["compilations"] += len(todo)
+    trees = comm.bcast(trees, root=0)
+    for (_, f, kernel_name, _), tree in zip(todo, trees):
+        TSFCKernelTree(f, kernel_name, parameters, interface, coffee, diagonal, tree=tree)
+
+
 def _real_mangle(form):
     """If the form contains arguments in the Real function space, replace these with literal 1 before passing to tsfc."""
 
@@ -251,9 +433,76 @@ def clear_cache(comm=None):
     if comm.rank == 0:
         import shutil
         shutil.rmtree(TSFCKernel._cachedir, ignore_errors=True)
+        DiskCached._disk_size = None
         _ensure_cachedir(comm=comm)
 
 
+def cache_stats():
+    """Return statistics about the Firedrake TSFC kernel cache in this process.
+
+    :returns: a dict with the number of ``memory_hits``,
+        ``disk_hits`` and ``misses`` for the generated kernels, the
+        same for the TSFC output they are generated from (prefixed
+        with ``tree_``), and the number of TSFC ``compilations`` and
+        their total ``compile_time`` in seconds.
+    """
+    keys = ["memory_hits", "disk_hits", "misses"]
+    stats = dict.fromkeys(keys + ["tree_" + k for k in keys] + ["compilations", "compile_time"], 0)
+    stats.update((k, TSFCKernel._stats[k]) for k in keys)
+    stats.update(("tree_" + k, TSFCKernelTree._stats[k]) for k in keys)
+    stats["compilations"] = TSFCKernelTree._stats["compilations"]
+    stats["compile_time"] = TSFCKernelTree._stats["compile_time"]
+    return stats
+
+
+def cache_usage():
+    """Return the number of kernels in the disk cache and their total size in bytes."""
+    entries = cache_entries(TSFCKernel._cachedir)
+    return len(entries), sum(size for _, size, _ in entries)
+
+
+def _prune_cachedir(max_size):
+    """Remove the least recently used kernels from the disk cache
+    until it is no larger than ``max_size`` bytes.
+
+    :returns: the number of kernels removed."""
+    removed, DiskCached._disk_size = prune_cachedir(TSFCKernel._cachedir, max_size)
+    return removed
+
+
+def prune_cache(max_size, comm=None):
+    """Remove the least recently used kernels from the Firedrake TSFC
+    kernel disk cache until it is no larger than ``max_size``.
+
+    :arg max_size: the size in bytes, or a string with a K, M or G suffix.
+    :returns: the number of kernels removed."""
+    comm = comm or COMM_WORLD
+    removed = None
+    if comm.rank == 0:
+        removed = _prune_cachedir(parse_size(max_size))
+    return comm.bcast(removed, root=0)
+
+
+def _free_node_comm(comm, keyval, node_comm):
+    node_comm.Free()
+    return MPI.SUCCESS
+
+
+_node_comm_keyval = MPI.Comm.Create_keyval(delete_fn=_free_node_comm)
+
+
+def _node_comm(comm):
+    """Return the communicator of the ranks of ``comm`` which share a
+    node (and hence memory) with this one.
+
+    This is collective over ``comm`` the first time it is called."""
+    node_comm = comm.Get_attr(_node_comm_keyval)
+    if node_comm is None:
+        node_comm = comm.Split_type(MPI.COMM_TYPE_SHARED)
+        comm.Set_attr(_node_comm_keyval, node_comm)
+    return node_comm
+
+
 def _ensure_cachedir(comm=None):
     """Ensure that the TSFC kernel cache directory exists."""
     comm = comm or COMM_WORLD
@@ -127,6 +127,21 @@ class NonlinearVariationalSolver(OptionsManager, NonlinearVariationalSolverMixin
                before residual assembly.
         :kwarg post_function_callback: As above, but called immediately
                after residual assembly.
+        :kwarg fused_assembly: If ``True``, assemble the Jacobian
+               together with the residual, traversing the mesh (and
+               gathering coordinates and coefficients) once for both.
+               The Jacobian is then reused if it is requested at the
+               same state, as it is in a Newton iteration.  This pays
+               off when most residual evaluations are followed by a
+               Jacobian evaluation (for example with the ``"basic"``
+               line search), since otherwise the Jacobian is assembled
+               for nothing: line searches, finite difference
+               evaluations and lagged Jacobians
+               (``snes_lag_jacobian``) all make it more expensive.
+               The Jacobian is assembled into a separate matrix, and
+               copied over, so this also needs memory for a second
+               Jacobian.  This is ignored if a ``pre_jacobian_callback``
+               is given.
 
         Example usage of the ``solver_parameters`` option: to set the
         nonlinear solver type to just use a linear solver, use
@@ -171,6 +186,7 @@ class NonlinearVariationalSolver(OptionsManager, NonlinearVariationalSolverMixin
         pre_f_callback = kwargs.get("pre_function_callback")
         post_j_callback = kwargs.get("post_jacobian_callback")
         post_f_callback = kwargs.get("post_function_callback")
+        fused_assembly = kwargs.get("fused_assembly", False)
 
         super(NonlinearVariationalSolver, self).__init__(parameters, options_prefix)
 
@@ -190,7 +206,8 @@ class NonlinearVariationalSolver(OptionsManager, NonlinearVariationalSolverMixin
                                          pre_function_callback=pre_f_callback,
                                          post_jacobian_callback=post_j_callback,
                                          post_function_callback=post_f_callback,
-                                         options_prefix=self.options_prefix)
+                                         options_prefix=self.options_prefix,
+                                         fused_assembly=fused_assembly)
 
         # No preconditioner by default for matrix-free
         if (problem.Jp is not None and pmatfree) or matfree:
@@ -0,0 +1,60 @@
+"""Helpers for inspecting and pruning the on-disk kernel caches.
+
+These live outside the :mod:`.firedrake` module so that
+`firedrake-clean` can use them even if Firedrake itself fails to
+import, for example because of a corrupt cache."""
+
+import os
+
+
+def parse_size(size):
+    """Parse a size in bytes, with an optional K, M or G suffix."""
+    size = str(size).strip().upper().rstrip("B")
+    scale = 1
+    for suffix, factor in (("K", 1024), ("M", 1024**2), ("G", 1024**3)):
+        if size.endswith(suffix):
+            size = size[:-1]
+            scale = factor
+            break
+    return int(float(size) * scale)
+
+
+def cache_entries(cachedir):
+    """Return a list of ``(modification time, size, path)`` for all
+    files in a cache directory, ignoring partially written ones."""
+    entries = []
+    for dirpath, _, filenames in os.walk(cachedir):
+        for filename in filenames:
+            if filename.endswith(".tmp"):
+                continue
+            filepath = os.path.join(dirpath, filename)
+            try:
+                st = os.stat(filepath)
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, filepath))
+    return entries
+
+
+def prune_cachedir(cachedir, max_size):
+    """Remove the files with the oldest modification time from a cache
+    directory until it is no larger than ``max_size`` bytes.
+
+    If the cache touches its files when they are read, as the TSFC
+    kernel cache does, this removes the least recently used files.
+    Otherwise it removes the least recently written ones.
+
+    :returns: the number of files removed and the remaining size."""
+    entries = sorted(cache_entries(cachedir))
+    total = sum(size for _, size, _ in entries)
+    removed = 0
+    for _, size, filepath in entries:
+        if total <= max_size:
+            break
+        try:
+            os.remove(filepath)
+        except OSError:
+            continue
+        total -= size
+        removed += 1
+    return removed, total
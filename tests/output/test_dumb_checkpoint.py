@@ -131,6 +131,45 @@ def test_multiple_timesteps(f, dumpfile):
         assert np.allclose(indices, [0, 1])
 
 
+def test_timestep_lookup(f, dumpfile):
+    with DumbCheckpoint(dumpfile, mode=FILE_CREATE) as chk:
+        for i in range(2000):
+            chk.set_timestep(0.5*i, idx=2*i)
+        chk.store(f)
+        assert chk.get_timestep_index(0.5) == 2
+        chk.set_timestep(0.25, idx=4001)
+        assert chk.get_timestep_index(0.25) == 4001
+
+    with DumbCheckpoint(dumpfile, mode=FILE_READ) as chk:
+        steps, indices = chk.get_timesteps()
+        assert len(steps) == len(indices) == 2001
+        assert np.allclose(steps[:2000], 0.5*np.arange(2000))
+        assert np.all(indices[:2000] == 2*np.arange(2000))
+        assert chk.get_timestep_index(999.5) == 3998
+        assert not chk.has_attribute("/", "stored_time_indices")
+        with pytest.raises(KeyError):
+            chk.get_timestep_index(0.3)
+
+
+def test_timesteps_in_attributes(f, dumpfile):
+    # Files written by older versions stored the timesteps as attributes
+    with DumbCheckpoint(dumpfile, mode=FILE_CREATE) as chk:
+        chk.write_attribute("/", "stored_time_indices", np.array([0., 1.]))
+        chk.write_attribute("/", "stored_time_steps", np.array([0.1, 0.2]))
+
+    with DumbCheckpoint(dumpfile, mode=FILE_READ) as chk:
+        steps, indices = chk.get_timesteps()
+        assert np.allclose(steps, [0.1, 0.2])
+        assert chk.get_timestep_index(0.2) == 1
+
+    with DumbCheckpoint(dumpfile, mode=FILE_UPDATE) as chk:
+        chk.set_timestep(0.3, idx=2)
+        steps, indices = chk.get_timesteps()
+        assert np.allclose(steps, [0.1, 0.2, 0.3])
+        assert np.all(indices == [0, 1, 2])
+        assert not chk.has_attribute("/", "stored_time_steps")
+
+
 def test_new_file(f, dumpfile):
     custom_name = "%s_custom" % dumpfile
     with DumbCheckpoint(dumpfile, single_file=False, mode=FILE_CREATE) as chk:
@@ -156,3 +195,45 @@ def test_new_file_valueerror(f, dumpfile):
         chk.store(f)
         with pytest.raises(ValueError):
             chk.new_file()
+
+
+def run_incremental(f, dumpfile):
+    dumpfile = f.function_space().mesh().comm.bcast(dumpfile, root=0)
+    g = Function(f, name="g")
+    with DumbCheckpoint(dumpfile, mode=FILE_CREATE, incremental=True) as chk:
+        for i in range(3):
+            chk.set_timestep(i)
+            g.assign(f + i)
+            chk.store(f)
+            chk.store(g)
+        # Storing the same timestep again after a change overwrites
+        # the data without touching the earlier timesteps.
+        f2 = Function(f, name="f")
+        f2.assign(f + 10)
+        chk.store(f2)
+
+        h5 = chk.h5file
+        assert h5["/fields/0/f"] == h5["/fields/1/f"]
+        assert h5["/fields/0/g"] != h5["/fields/1/g"]
+        assert h5["/fields/1/f"] != h5["/fields/2/f"]
+
+    with DumbCheckpoint(dumpfile, mode=FILE_READ) as chk:
+        h = Function(f.function_space())
+        for i in range(3):
+            chk.set_timestep(i)
+            chk.load(h, name="f")
+            assert np.allclose(h.dat.data_ro, f.dat.data_ro + (10 if i == 2 else 0))
+            chk.load(h, name="g")
+            assert np.allclose(h.dat.data_ro, f.dat.data_ro + i)
+
+
+def test_incremental(f, dumpfile):
+    run_incremental(f, dumpfile)
+
+
+@pytest.mark.parallel(nprocs=2)
+def test_incremental_parallel(dumpfile):
+    mesh = UnitSquareMesh(4, 4)
+    x, y = SpatialCoordinate(mesh)
+    f = Function(FunctionSpace(mesh, "CG", 1), name="f").interpolate(x*y)
+    run_incremental(f, dumpfile)
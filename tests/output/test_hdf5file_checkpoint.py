@@ -4,6 +4,7 @@ from firedrake import *
 import numpy as np
 from mpi4py import MPI
 import math
+import h5py
 
 
 @pytest.fixture(scope="module",
@@ -129,3 +130,176 @@ def test_multiple_timestamps(f, dumpfile):
         timestamps = h5.get_timestamps()
 
         assert np.allclose(timestamps, [0.1, 0.2])
+
+
+@pytest.fixture(params=[("CG", 2, None), ("DG", 1, None), ("CG", 1, 2)],
+                ids=["CG2", "DG1", "VectorCG1"])
+def redistributable_space(request):
+    return request.param
+
+
+def make_function(family, degree, dim, comm):
+    mesh = UnitSquareMesh(4, 4, comm=comm)
+    x, y = SpatialCoordinate(mesh)
+    if dim is None:
+        V = FunctionSpace(mesh, family, degree)
+        expr = x*x + 3*y
+    else:
+        V = VectorFunctionSpace(mesh, family, degree, dim=dim)
+        expr = as_vector([x + 2*y, x*y])
+    f = Function(V, name="f")
+    f.interpolate(expr)
+    return f
+
+
+def test_read_redistributed(redistributable_space, dumpfile):
+    f = make_function(*redistributable_space, comm=MPI.COMM_WORLD)
+    with HDF5File(dumpfile, "w") as h5:
+        h5.write(f, "/solution")
+
+    # Pretend the file was written on a different number of processes.
+    with h5py.File(dumpfile, "a") as h5:
+        h5["/solution"].attrs["nprocs"] = 2
+
+    g = Function(f.function_space())
+    with HDF5File(dumpfile, "r") as h5:
+        h5.read(g, "/solution")
+    assert np.allclose(f.dat.data_ro, g.dat.data_ro)
+
+
+def test_read_redistributed_not_supported(dumpfile):
+    mesh = UnitSquareMesh(2, 2)
+    f = Function(FunctionSpace(mesh, "RT", 1))
+    with HDF5File(dumpfile, "w") as h5:
+        h5.write(f, "/solution")
+
+    with h5py.File(dumpfile, "a") as h5:
+        h5["/solution"].attrs["nprocs"] = 2
+
+    with HDF5File(dumpfile, "r") as h5:
+        with pytest.raises(ValueError):
+            h5.read(f, "/solution")
+
+
+@pytest.mark.parallel(nprocs=3)
+def test_write_serial_read_parallel(redistributable_space, dumpfile):
+    dumpfile = MPI.COMM_WORLD.bcast(dumpfile, root=0)
+    if MPI.COMM_WORLD.rank == 0:
+        f = make_function(*redistributable_space, comm=MPI.COMM_SELF)
+        with HDF5File(dumpfile, "w", comm=MPI.COMM_SELF) as h5:
+            h5.write(f, "/solution", timestamp=0.5)
+    MPI.COMM_WORLD.barrier()
+
+    f = make_function(*redistributable_space, comm=MPI.COMM_WORLD)
+    g = Function(f.function_space())
+    with HDF5File(dumpfile, "r") as h5:
+        h5.read(g, "/solution", timestamp=0.5)
+    assert np.allclose(f.dat.data_ro, g.dat.data_ro)
+
+
+@pytest.mark.parallel(nprocs=3)
+def test_write_parallel_read_parallel(redistributable_space, dumpfile):
+    dumpfile = MPI.COMM_WORLD.bcast(dumpfile, root=0)
+    f = make_function(*redistributable_space, comm=MPI.COMM_WORLD)
+    with HDF5File(dumpfile, "w") as h5:
+        h5.write(f, "/solution")
+
+    # Read back on two of the three processes.
+    comm = MPI.COMM_WORLD.Split(MPI.COMM_WORLD.rank // 2)
+    if MPI.COMM_WORLD.rank < 2:
+        f = make_function(*redistributable_space, comm=comm)
+        g = Function(f.function_space())
+        with HDF5File(dumpfile, "r", comm=comm) as h5:
+            h5.read(g, "/solution")
+        assert np.allclose(f.dat.data_ro, g.dat.data_ro)
+    comm.Free()
+
+
+def test_asynchronous(f, dumpfile):
+    g = Function(f)
+    with HDF5File(dumpfile, "w", asynchronous=True) as h5:
+        for t in range(4):
+            g.assign(f + t)
+            h5.write(g, "/solution", timestamp=t)
+            # Modifying the function does not change what is written.
+            g.assign(-1)
+        h5.wait()
+        assert np.allclose(h5.get_timestamps(), range(4))
+
+    h = Function(f.function_space())
+    with HDF5File(dumpfile, "r") as h5:
+        for t in range(4):
+            h5.read(h, "/solution", timestamp=t)
+            assert np.allclose(h.dat.data_ro, f.dat.data_ro + t)
+
+
+@pytest.mark.parametrize("kwargs",
+                         [dict(compression="gzip", compression_opts=9),
+                          dict(compression="lzf", shuffle=True),
+                          dict(compression="gzip", chunks=5)])
+def test_compressed(f, dumpfile, kwargs):
+    with HDF5File(dumpfile, "w", **kwargs) as h5:
+        h5.write(f, "/solution")
+
+    with h5py.File(dumpfile, "r") as h5:
+        dset = h5["/solution"]
+        assert dset.compression == kwargs["compression"]
+        assert dset.shuffle == kwargs.get("shuffle", False)
+        if "chunks" in kwargs:
+            assert dset.chunks == (kwargs["chunks"], )
+
+    g = Function(f.function_space())
+    with HDF5File(dumpfile, "r") as h5:
+        h5.read(g, "/solution")
+    assert np.allclose(f.dat.data_ro, g.dat.data_ro)
+
+
+def test_bad_compression(dumpfile):
+    with pytest.raises(ValueError):
+        HDF5File(dumpfile, "w", compression="bzip2")
+
+
+@pytest.mark.parallel(nprocs=2)
+def test_compressed_parallel(dumpfile):
+    dumpfile = MPI.COMM_WORLD.bcast(dumpfile, root=0)
+    mesh = UnitSquareMesh(4, 4)
+    x, y = SpatialCoordinate(mesh)
+    f = Function(FunctionSpace(mesh, "CG", 2)).interpolate(x*y)
+    g = Function(f.function_space())
+    with HDF5File(dumpfile, "w", compression="gzip", shuffle=True) as h5:
+        h5.write(f, "/solution")
+        h5.read(g, "/solution")
+    assert np.allclose(f.dat.data_ro, g.dat.data_ro)
+
+
+def test_read_mapped(f, dumpfile):
+    V = f.function_space()
+    W = V*V
+    w = Function(W)
+    w.sub(0).assign(f)
+    w.sub(1).assign(f + 1)
+    with HDF5File(dumpfile, "w") as h5:
+        h5.write(f, "/f", timestamp=0.5)
+        h5.write(w, "/w")
+        g = h5.read_mapped(V, "/f", timestamp=0.5, name="g")
+
+    assert g.name() == "g"
+    assert np.allclose(g.dat.data_ro, f.dat.data_ro)
+    # Copy on write: the file is not modified.
+    g.assign(0)
+
+    with HDF5File(dumpfile, "r") as h5:
+        g = h5.read_mapped(V, "/f", timestamp=0.5)
+        assert np.allclose(g.dat.data_ro, f.dat.data_ro)
+        w2 = h5.read_mapped(W, "/w")
+        assert np.allclose(w2.dat.data_ro[0], f.dat.data_ro)
+        assert np.allclose(w2.dat.data_ro[1], f.dat.data_ro + 1)
+        with pytest.raises(ValueError):
+            h5.read_mapped(W, "/f", timestamp=0.5)
+
+
+def test_read_mapped_chunked(f, dumpfile):
+    with HDF5File(dumpfile, "w", compression="gzip") as h5:
+        h5.write(f, "/f")
+        with pytest.raises(ValueError):
+            h5.read_mapped(f.function_space(), "/f")
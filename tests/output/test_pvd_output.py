@@ -1,9 +1,13 @@
 from os import listdir
 from os.path import isfile, join
 from collections import Counter
+import re
+import zlib
+import numpy as np
 import pytest
 from functools import partial
 from firedrake import *
+from firedrake.output import get_array, get_vtu_name
 
 
 @pytest.fixture(params=["interval", "square[tri]", "square[quad]",
@@ -129,3 +133,106 @@ def test_append(mesh, tmpdir):
         return Counter(s) == Counter(t)
 
     assert compare(files_in_tmp, expected_files)
+
+
+def test_asynchronous(mesh, dumpdir):
+    V = FunctionSpace(mesh, "DG", 0)
+    f = Function(V, name="foo")
+
+    sync = File(join(dumpdir, "sync.pvd"))
+    asynchronous = File(join(dumpdir, "async.pvd"), asynchronous=True,
+                        max_pending_writes=1)
+    for i in range(3):
+        f.assign(i)
+        sync.write(f, time=i)
+        asynchronous.write(f, time=i)
+    # The data were copied, so this does not change the output
+    f.assign(-1)
+    asynchronous.close()
+
+    for i in range(3):
+        with open(get_vtu_name(join(dumpdir, "sync_%d" % i), mesh.comm.rank, mesh.comm.size), "rb") as a, \
+                open(get_vtu_name(join(dumpdir, "async_%d" % i), mesh.comm.rank, mesh.comm.size), "rb") as b:
+            assert a.read() == b.read()
+    with open(join(dumpdir, "sync.pvd")) as a, open(join(dumpdir, "async.pvd")) as b:
+        assert a.read().replace("sync_", "async_") == b.read()
+
+    with pytest.raises(ValueError):
+        asynchronous.write(f)
+
+
+@pytest.mark.parallel
+def test_asynchronous_parallel(mesh, dumpdir):
+    test_asynchronous(mesh, dumpdir)
+
+
+def read_appended_arrays(fname):
+    """Decode the (raw or zlib compressed) arrays in a VTU file."""
+    with open(fname, "rb") as f:
+        data = f.read()
+    compressed = b'compressor="vtkZLibDataCompressor"' in data
+    start = data.index(b"_", data.index(b"<AppendedData")) + 1
+    arrays = []
+    for offset in re.findall(rb'offset="(\d+)"', data):
+        pos = start + int(offset)
+        if not compressed:
+            nbytes, = np.frombuffer(data, dtype=np.uint32, count=1, offset=pos)
+            arrays.append(data[pos+4:pos+4+nbytes])
+            continue
+        nblocks, block_size, last = np.frombuffer(data, dtype=np.uint32, count=3, offset=pos)
+        sizes = np.frombuffer(data, dtype=np.uint32, count=nblocks, offset=pos + 12)
+        pos += 12 + 4*nblocks
+        blocks = []
+        for size in sizes:
+            blocks.append(zlib.decompress(data[pos:pos+size]))
+            pos += size
+        assert all(len(b) == block_size for b in blocks[:-1])
+        assert len(blocks[-1]) == (last or block_size)
+        arrays.append(b"".join(blocks))
+    return arrays
+
+
+def test_compressed(mesh, dumpdir):
+    V = FunctionSpace(mesh, "DG", 1)
+    f = Function(V, name="foo")
+    f.dat.data[:] = np.arange(len(f.dat.data))
+
+    raw = File(join(dumpdir, "raw.pvd"))
+    compressed = File(join(dumpdir, "compressed.pvd"), compression="zlib",
+                      compression_level=9, compression_block_size=256)
+    raw.write(f)
+    compressed.write(f)
+
+    rank, size = mesh.comm.rank, mesh.comm.size
+    expect = read_appended_arrays(get_vtu_name(join(dumpdir, "raw_0"), rank, size))
+    arrays = read_appended_arrays(get_vtu_name(join(dumpdir, "compressed_0"), rank, size))
+    # Coordinates, connectivity, offsets, types and foo
+    assert len(arrays) == len(expect) == 5
+    assert arrays == expect
+
+
+def test_bad_compression(tmpdir):
+    with pytest.raises(ValueError):
+        File(str(tmpdir.join("foo.pvd")), compression="bz2")
+
+
+@pytest.mark.parametrize("shape", [(2, ), (2, 2), (3, ), (3, 3)])
+def test_padded_array_reused(mesh, shape):
+    if len(shape) == 1:
+        V = VectorFunctionSpace(mesh, "DG", 0, dim=shape[0])
+    else:
+        V = TensorFunctionSpace(mesh, "DG", 0, shape=shape)
+    f = Function(V)
+    f.dat.data[:] = 1
+    padded = (len(f.dat.data_ro_with_halos), ) + (3, )*len(shape)
+
+    a = get_array(f)
+    assert a.shape == padded and np.sum(a) == np.prod(shape)*padded[0]
+    f.dat.data[:] = 2
+    b = get_array(f, out=a)
+    assert b.shape == padded and np.sum(b) == 2*np.prod(shape)*padded[0]
+    if shape in [(3, ), (3, 3)]:
+        # No padding needed, so no copy
+        assert np.shares_memory(b, f.dat.data_ro_with_halos)
+    else:
+        assert b is a
@@ -0,0 +1,121 @@
+from os import listdir
+from os.path import join
+import h5py
+import numpy as np
+import pytest
+from firedrake import *
+
+
+@pytest.fixture
+def mesh():
+    return UnitSquareMesh(4, 4)
+
+
+def test_static_mesh_written_once(mesh, dumpdir):
+    V = FunctionSpace(mesh, "CG", 1)
+    f = Function(V, name="foo")
+    outfile = File(join(dumpdir, "out.vtkhdf"))
+    for i in range(3):
+        f.assign(i)
+        outfile.write(f, time=0.5*i)
+    outfile.close()
+
+    with h5py.File(join(dumpdir, "out.vtkhdf"), "r") as h5:
+        root = h5["VTKHDF"]
+        npoints, = root["NumberOfPoints"]
+        assert root["Points"].shape == (npoints, 3)
+        assert root["NumberOfCells"][0] == root["Types"].shape[0] == 32
+        assert root["Steps"].attrs["NSteps"] == 3
+        assert np.allclose(root["Steps/Values"], [0, 0.5, 1])
+        assert np.all(root["Steps/PointOffsets"][:] == 0)
+        assert np.all(root["Steps/PointDataOffsets/foo"][:] == [0, npoints, 2*npoints])
+        assert np.allclose(root["PointData/foo"][2*npoints:], 2)
+
+
+def test_integer_time_first(mesh, dumpdir):
+    V = FunctionSpace(mesh, "CG", 1)
+    f = Function(V, name="foo")
+    outfile = File(join(dumpdir, "out.vtkhdf"))
+    outfile.write(f, time=0)
+    outfile.write(f, time=0.5)
+    outfile.close()
+
+    with h5py.File(join(dumpdir, "out.vtkhdf"), "r") as h5:
+        values = h5["VTKHDF/Steps/Values"]
+        assert values.dtype == np.float64
+        assert np.allclose(values, [0, 0.5])
+
+
+def test_moving_mesh(mesh, dumpdir):
+    V = FunctionSpace(mesh, "CG", 1)
+    f = Function(V, name="foo")
+    outfile = File(join(dumpdir, "out.vtkhdf"))
+    outfile.write(f)
+    outfile.write(f)
+    mesh.coordinates.dat.data[:] *= 2
+    outfile.write(f)
+    outfile.close()
+
+    with h5py.File(join(dumpdir, "out.vtkhdf"), "r") as h5:
+        root = h5["VTKHDF"]
+        npoints, = root["NumberOfPoints"]
+        assert root["Points"].shape == (2*npoints, 3)
+        assert np.all(root["Steps/PointOffsets"][:] == [0, 0, npoints])
+        assert np.isclose(root["Points"][npoints:].max(), 2)
+
+
+def test_append(mesh, dumpdir):
+    V = VectorFunctionSpace(mesh, "CG", 1)
+    f = Function(V, name="foo")
+    outfile = File(join(dumpdir, "out.vtkhdf"), compression="zlib")
+    outfile.write(f)
+    outfile.close()
+
+    outfile = File(join(dumpdir, "out.vtkhdf"), mode="a", compression="zlib")
+    outfile.write(f)
+    outfile.close()
+
+    with h5py.File(join(dumpdir, "out.vtkhdf"), "r") as h5:
+        root = h5["VTKHDF"]
+        assert root["Steps"].attrs["NSteps"] == 2
+        assert np.allclose(root["Steps/Values"], [0, 1])
+        assert root["PointData/foo"].compression == "gzip"
+        # Vectors are padded to three components
+        assert root["PointData/foo"].shape[1] == 3
+
+
+def test_bad_compression(mesh, dumpdir):
+    with pytest.raises(ValueError):
+        File(join(dumpdir, "out.vtkhdf"), compression="lz4")
+
+
+@pytest.mark.parallel(nprocs=3)
+def test_parallel_single_file(mesh, dumpdir):
+    V = FunctionSpace(mesh, "DG", 0)
+    f = Function(V, name="foo")
+    f.dat.data[:] = mesh.comm.rank
+    outfile = File(join(dumpdir, "out.vtkhdf"))
+    outfile.write(f)
+    outfile.write(f)
+    outfile.close()
+
+    if mesh.comm.rank == 0:
+        assert listdir(dumpdir) == ["out.vtkhdf"]
+    with h5py.File(join(dumpdir, "out.vtkhdf"), "r", driver="mpio", comm=mesh.comm) as h5:
+        root = h5["VTKHDF"]
+        assert np.all(root["Steps/NumberOfParts"][:] == 3)
+        assert np.all(root["Steps/PartOffsets"][:] == 0)
+        ncells = root["NumberOfCells"][:]
+        assert ncells[mesh.comm.rank] == mesh.cell_set.size
+        assert ncells.sum() == 32
+        assert root["Offsets"].shape == (32 + 3, )
+        npoints = root["NumberOfPoints"][:]
+        assert root["Points"].shape == (npoints.sum(), 3)
+        assert root["PointData/foo"].shape == (2*npoints.sum(), )
+        assert np.all(root["Steps/PointDataOffsets/foo"][:] == [0, npoints.sum()])
+
+
+@pytest.mark.parallel(nprocs=2)
+def test_parallel_compression_unsupported(mesh, dumpdir):
+    with pytest.raises(ValueError):
+        File(join(dumpdir, "out.vtkhdf"), compression="zlib")
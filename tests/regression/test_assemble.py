@@ -143,3 +143,178 @@ def test_assemble_diagonal_bcs(mesh):
     M = assemble(a, mat_type="aij", bcs=bc)
     Mdiag = assemble(a, bcs=bc, diagonal=True)
     assert np.allclose(M.petscmat.getDiagonal().array_r, Mdiag.dat.data_ro)
+
+
+def test_assemble_shares_sparsity(mesh):
+    V = FunctionSpace(mesh, "CG", 1)
+    u = TrialFunction(V)
+    v = TestFunction(V)
+    M = assemble(u*v*dx)
+    K = assemble(inner(grad(u), grad(v))*dx + u*v*dx)
+    assert M.M.sparsity is K.M.sparsity
+    F = assemble(u*v*ds(1) + u*v*ds(2))
+    G = assemble(u*v*ds)
+    assert F.M.sparsity is G.M.sparsity
+    assert F.M.sparsity is not M.M.sparsity
+
+
+def test_assemble_reuses_plan(mesh):
+    V = FunctionSpace(mesh, "CG", 1)
+    u = TrialFunction(V)
+    v = TestFunction(V)
+    f = Function(V)
+    bc = DirichletBC(V, 0, 1)
+    L = f*v*dx
+    a = f*u*v*dx
+    b = Function(V)
+    A = assemble(a, bcs=bc)
+    for val in [1, 2]:
+        f.assign(val)
+        assemble(L, tensor=b, bcs=bc)
+        assemble(a, tensor=A, bcs=bc)
+        assert np.allclose(b.dat.data_ro, assemble(L, bcs=bc).dat.data_ro)
+        assert np.allclose(A.M.values, assemble(a, bcs=bc).M.values)
+    assert len(b._assembly_plans) == 1
+    assert len(A._assembly_plans) == 1
+
+    # Replacing the data of a coefficient rebuilds the plan
+    plans, = b._assembly_plans.values()
+    plan, = plans.values()
+    f.dat = Function(V).assign(3).dat
+    assemble(L, tensor=b, bcs=bc)
+    assert plans[next(iter(plans))] is not plan
+    assert np.allclose(b.dat.data_ro, assemble(L, bcs=bc).dat.data_ro)
+
+    # The plan goes away with the form
+    del L
+    assert len(b._assembly_plans) == 0
+
+
+def test_assemble_plan_does_not_leak(mesh):
+    import gc
+    import weakref
+    V = FunctionSpace(mesh, "CG", 1)
+    u = TrialFunction(V)
+    v = TestFunction(V)
+    a = u*v*dx
+    A = assemble(a, mat_type="aij")
+    # A refers to a, on which its plan is keyed
+    assemble(a, tensor=A, mat_type="aij")
+    assemble(a, tensor=A, mat_type="aij")
+    A = weakref.ref(A)
+    del a
+    gc.collect()
+    assert A() is None
+
+
+@pytest.mark.parametrize("mixed", [False, True], ids=["scalar", "mixed"])
+def test_fused_residual_and_jacobian(mesh, mixed):
+    from firedrake.assemble import allocate_matrix, create_assembly_callable, \
+        create_fused_assembly_callable
+    V = FunctionSpace(mesh, "CG", 2)
+    if mixed:
+        V = V*FunctionSpace(mesh, "DG", 1)
+    u = Function(V)
+    x, y = SpatialCoordinate(mesh)
+    for u_ in u.split():
+        u_.interpolate(x*y + 1)
+    v = TestFunction(V)
+    F = (inner(grad(u), grad(v)) + inner(u, u)*inner(u, v))*dx + inner(u, v)*ds(1)
+    J = derivative(F, u)
+    bcs = [DirichletBC(V.sub(0) if mixed else V, 0, 3)]
+
+    F_fused = Function(V)
+    F_separate = Function(V)
+    J_fused = allocate_matrix(J, bcs=bcs, mat_type="aij")
+    J_separate = allocate_matrix(J, bcs=bcs, mat_type="aij")
+
+    create_fused_assembly_callable([F, J], [F_fused, J_fused], bcs=[bcs, bcs],
+                                   mat_type="aij")()
+    create_assembly_callable(F, tensor=F_separate, bcs=bcs)()
+    create_assembly_callable(J, tensor=J_separate, bcs=bcs, mat_type="aij")()
+
+    for f, g in zip(F_fused.dat.data_ro, F_separate.dat.data_ro):
+        assert np.allclose(f, g)
+    assert np.allclose(J_fused.M.values, J_separate.M.values)
+
+
+def test_assemble_many(mesh):
+    V = FunctionSpace(mesh, "CG", 2)
+    W = VectorFunctionSpace(mesh, "CG", 1)
+    x, y = SpatialCoordinate(mesh)
+    f = Function(V).interpolate(x + y)
+    g = Function(W).interpolate(as_vector([y, x*x]))
+    v = TestFunction(V)
+    u = TrialFunction(V)
+    bc = DirichletBC(V, 1, 2)
+    forms = [f*f*dx,
+             f*v*dx + inner(g, grad(v))*dx,
+             inner(grad(f), grad(v))*dx + f*v*ds(3),
+             div(g)*v*dx,
+             inner(grad(u), grad(v))*dx]
+    bcs = [None, None, bc, None, bc]
+    results = assemble_many(forms, bcs=bcs, mat_type="aij")
+    expected = [assemble(form, bcs=bcs_, mat_type="aij") for form, bcs_ in zip(forms, bcs)]
+
+    assert np.allclose(results[0], expected[0])
+    for result, expect in zip(results[1:4], expected[1:4]):
+        assert np.allclose(result.dat.data_ro, expect.dat.data_ro)
+    assert np.allclose(results[4].M.values, expected[4].M.values)
+
+    # Assembling into existing tensors
+    tensors = [None, Function(V), None, None, None]
+    results = assemble_many(forms[:2], tensors=tensors[:2])
+    assert results[1] is tensors[1]
+    assert np.allclose(tensors[1].dat.data_ro, expected[1].dat.data_ro)
+
+
+def test_assemble_many_bad_arguments(mesh):
+    V = FunctionSpace(mesh, "CG", 1)
+    v = TestFunction(V)
+    with pytest.raises(ValueError):
+        assemble_many([v*dx, v*ds], tensors=[None])
+    with pytest.raises(TypeError):
+        assemble_many([v*dx, v])
+
+
+def test_colour():
+    from firedrake.assemble import _colour
+    values = np.random.RandomState(3).randint(-1, 500, size=(2000, 6))
+    colours = _colour(values)
+    assert (colours >= 0).all()
+    for c in range(colours.max() + 1):
+        touched = np.concatenate([np.unique(v[v >= 0]) for v in values[colours == c]])
+        assert len(touched) == len(np.unique(touched))
+
+
+@pytest.fixture
+def threaded():
+    parameters["assembly_threads"] = 4
+    yield
+    parameters["assembly_threads"] = 1
+
+
+@pytest.mark.parametrize("mixed", [False, True], ids=["scalar", "mixed"])
+def test_threaded_assembly(mesh, mixed, threaded):
+    V = FunctionSpace(mesh, "DG", 1)
+    if mixed:
+        V = V*FunctionSpace(mesh, "CG", 2)
+    x, y = SpatialCoordinate(mesh)
+    f = Function(V)
+    for f_ in f.split():
+        f_.interpolate(x*y + 1)
+    v = TestFunction(V)
+    u = TrialFunction(V)
+    n = FacetNormal(mesh)
+    L = (inner(f, v)*dx + inner(f, v)*ds(1)
+         + inner(jump(grad(f)), jump(grad(v)))*dS + inner(avg(f), jump(v, n[0]))*dS)
+    a = inner(u, v)*dx + inner(jump(u), jump(v))*dS
+
+    b = assemble(L)
+    A = assemble(a, mat_type="aij")
+    parameters["assembly_threads"] = 1
+    expect_b = assemble(L)
+    expect_A = assemble(a, mat_type="aij")
+    for c, d in zip(b.dat.data_ro, expect_b.dat.data_ro):
+        assert np.allclose(c, d)
+    assert np.allclose(A.M.values, expect_A.M.values)
@@ -40,3 +40,86 @@ def test_locate_cell_not_found(meshdata):
     m, f = meshdata
 
     assert m.locate_cell((0.2, -0.4)) is None
+
+
+def test_locate_cells(meshdata):
+    m, f = meshdata
+
+    points = np.array([(0.2, 0.1), (0.5, 0.9), (0.2, -0.4), (0.9, 0.8)])
+    cells = m.locate_cells(points)
+    assert cells[2] == -1
+    assert np.allclose([1, 8, 9], f.dat.data[cells[[0, 1, 3]]])
+    assert all(m.locate_cell(p) == c for p, c in zip(points[[0, 1, 3]], cells[[0, 1, 3]]))
+
+
+@pytest.fixture
+def grid_index():
+    old = parameters["spatial_index"]
+    parameters["spatial_index"] = "grid"
+    yield
+    parameters["spatial_index"] = old
+
+
+@pytest.mark.parametrize("mesh", ["interval", "square", "extruded", "cube"])
+def test_locate_cells_grid_index(grid_index, mesh):
+    m = {"interval": lambda: UnitIntervalMesh(7),
+         "square": lambda: UnitSquareMesh(5, 4),
+         "extruded": lambda: ExtrudedMesh(UnitIntervalMesh(3), 4),
+         "cube": lambda: UnitCubeMesh(3, 2, 4)}[mesh]()
+    V = FunctionSpace(m, "DG", 0)
+    f = Function(V).interpolate(SpatialCoordinate(m)[0])
+
+    points = np.random.RandomState(0).rand(50, m.geometric_dimension())
+    cells = m.locate_cells(points)
+    assert (cells != -1).all()
+    assert np.allclose(f.at(points), f.dat.data[cells])
+    assert (m.locate_cells(points + 2) == -1).all()
+
+
+@pytest.mark.parametrize("index_type", ["rtree", "grid"])
+def test_locate_cell_moved_mesh(index_type):
+    old = parameters["spatial_index"]
+    parameters["spatial_index"] = index_type
+    try:
+        m = UnitSquareMesh(10, 10)
+        assert m.locate_cell((1.1, 1.1)) is None
+
+        # Move a single vertex: only the cells around it are updated
+        coords = m.coordinates.dat.data
+        corner, = np.flatnonzero(np.all(np.isclose(coords, 1), axis=1))
+        coords[corner] = (1.2, 1.2)
+        assert m.locate_cell((1.1, 1.1)) is not None
+        assert m.locate_cell((0.55, 0.55)) is not None
+
+        # Move every vertex
+        m.coordinates.dat.data[:] += 2
+        assert m.locate_cell((0.55, 0.55)) is None
+        assert m.locate_cell((2.55, 2.55)) is not None
+
+        # Assigning to the coordinates
+        m.coordinates.assign(m.coordinates - Constant((2, 2)))
+        assert m.locate_cell((0.55, 0.55)) is not None
+        assert m.locate_cell((2.55, 2.55)) is None
+    finally:
+        parameters["spatial_index"] = old
+
+
+@pytest.mark.parametrize("index_type", ["rtree", "grid"])
+def test_locate_cells_moved_mesh(index_type):
+    old = parameters["spatial_index"]
+    parameters["spatial_index"] = index_type
+    try:
+        m = UnitSquareMesh(6, 5)
+        points = np.random.RandomState(0).rand(40, 2)
+        cells = m.locate_cells(points)
+        assert (cells != -1).all()
+
+        m.coordinates += Constant((1, 2))
+        assert (m.locate_cells(points) == -1).all()
+        assert (m.locate_cells(points + (1, 2)) == cells).all()
+
+        m.coordinates.dat.data[:] = m.coordinates.dat.data_ro * 2
+        assert (m.locate_cells(2 * (points + (1, 2))) == cells).all()
+        assert (m.locate_cells(points + (1, 2)) == -1).all()
+    finally:
+        parameters["spatial_index"] = old
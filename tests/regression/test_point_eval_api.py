@@ -141,3 +141,118 @@ def test_nascent_parallel_support():
     assert np.allclose(0.0576, f.at([0.12, 0.18]))
     assert np.allclose(1.0266, f.at([0.98, 0.87]))
     assert np.allclose([0.2176, 0.2822], f.at([0.12, 0.68], [0.63, 0.34]))
+
+
+def test_many_points():
+    mesh = UnitSquareMesh(8, 8)
+    V = FunctionSpace(mesh, "CG", 2)
+    x = SpatialCoordinate(mesh)
+    f = Function(V).interpolate((x[0] + 0.2)*x[1])
+
+    points = np.random.RandomState(0).rand(500, 2)
+    expected = (points[:, 0] + 0.2)*points[:, 1]
+    assert np.allclose(expected, f.at(points))
+
+
+def test_many_points_mixed():
+    mesh = UnitSquareMesh(4, 4)
+    V1 = FunctionSpace(mesh, "CG", 1)
+    V2 = VectorFunctionSpace(mesh, "CG", 1)
+    f = Function(V1 * V2)
+    f1, f2 = f.split()
+    x = SpatialCoordinate(mesh)
+    f1.interpolate(x[0] + x[1])
+    f2.interpolate(as_vector((x[1], 2*x[0])))
+
+    points = [[0.1, 0.2], [1.5, 0.5], [0.7, 0.3]]
+    actual = f.at(points, dont_raise=True)
+    assert actual[1] is None
+    for p, (a1, a2) in zip([points[0], points[2]], [actual[0], actual[2]]):
+        assert np.allclose(p[0] + p[1], a1)
+        assert np.allclose([p[1], 2*p[0]], a2)
+
+
+def test_point_evaluator():
+    mesh = UnitSquareMesh(8, 8)
+    V = FunctionSpace(mesh, "CG", 2)
+    W = VectorFunctionSpace(mesh, "DG", 1)
+    x = SpatialCoordinate(mesh)
+    f = Function(V).interpolate((x[0] + 0.2)*x[1])
+    g = Function(W).interpolate(as_vector((x[1], 2*x[0])))
+
+    points = np.random.RandomState(0).rand(100, 2)
+    evaluator = PointEvaluator(mesh, points)
+    assert np.allclose((points[:, 0] + 0.2)*points[:, 1], evaluator.evaluate(f))
+    assert np.allclose(np.stack([points[:, 1], 2*points[:, 0]], axis=1),
+                       evaluator.evaluate(g))
+
+
+def test_point_evaluator_dont_raise():
+    mesh = UnitIntervalMesh(4)
+    f = mesh.coordinates
+
+    evaluator = PointEvaluator(mesh, [0.5, 1.2])
+    with pytest.raises(PointNotInDomainError):
+        evaluator.evaluate(f)
+
+    actual = evaluator.evaluate(f, dont_raise=True)
+    assert np.allclose(0.5, actual[0])
+    assert np.isnan(actual[1])
+
+
+def test_point_evaluator_moving_mesh():
+    mesh = UnitSquareMesh(4, 4)
+    V = FunctionSpace(mesh, "CG", 1)
+    f = Function(V).interpolate(SpatialCoordinate(mesh)[0])
+
+    evaluator = PointEvaluator(mesh, [[1.5, 0.5]])
+    assert np.isnan(evaluator.evaluate(f, dont_raise=True)[0])
+
+    mesh.coordinates.dat.data[:, 0] *= 2
+    assert np.allclose(0.75, evaluator.evaluate(f))
+
+    mesh.coordinates += Constant((-1, 0))
+    assert np.isnan(evaluator.evaluate(f, dont_raise=True)[0])
+
+
+@pytest.mark.parallel(nprocs=3)
+def test_point_evaluator_parallel():
+    mesh = UnitSquareMesh(8, 8)
+    V = FunctionSpace(mesh, "CG", 2)
+    x = SpatialCoordinate(mesh)
+    f = Function(V).interpolate((x[0] + 0.2)*x[1])
+
+    points = np.random.RandomState(0).rand(50, 2)
+    evaluator = PointEvaluator(mesh, points)
+    assert np.allclose((points[:, 0] + 0.2)*points[:, 1], evaluator.evaluate(f))
+
+
+@pytest.mark.parallel(nprocs=3)
+def test_point_evaluator_parallel_partition_boundary():
+    mesh = UnitSquareMesh(8, 8)
+    V = FunctionSpace(mesh, "CG", 2)
+    x = SpatialCoordinate(mesh)
+    f = Function(V).interpolate((x[0] + 0.2)*x[1])
+
+    # Every vertex and facet midpoint, many of which are on the
+    # boundary between partitions
+    points = np.mgrid[0:1:17j, 0:1:17j].reshape(2, -1).T
+    expected = (points[:, 0] + 0.2)*points[:, 1]
+    evaluator = PointEvaluator(mesh, points)
+    assert np.allclose(expected, evaluator.evaluate(f))
+    assert evaluator.found.all()
+    assert np.allclose(expected, f.at(points))
+
+
+@pytest.mark.parallel(nprocs=3)
+def test_point_evaluator_parallel_not_redundant():
+    mesh = UnitSquareMesh(8, 8)
+    V = FunctionSpace(mesh, "CG", 2)
+    x = SpatialCoordinate(mesh)
+    f = Function(V).interpolate((x[0] + 0.2)*x[1])
+
+    points = np.random.RandomState(mesh.comm.rank).rand(10 + mesh.comm.rank, 2)
+    evaluator = PointEvaluator(mesh, points, redundant=False)
+    actual = evaluator.evaluate(f)
+    assert actual.shape == (10 + mesh.comm.rank, )
+    assert np.allclose((points[:, 0] + 0.2)*points[:, 1], actual)
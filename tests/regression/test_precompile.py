@@ -0,0 +1,58 @@
+import pytest
+import numpy as np
+from firedrake import *
+
+
+@pytest.fixture(scope='module')
+def V():
+    mesh = UnitSquareMesh(2, 2)
+    return FunctionSpace(mesh, "CG", 2)
+
+
+def test_precompile_forms(V):
+    u = TrialFunction(V)
+    v = TestFunction(V)
+    f = Function(V)
+    a = (inner(grad(u), grad(v)) + 7*u*v) * dx
+    L = f*v*ds
+
+    assert precompile(forms=[a, L]) == 2
+
+    # Everything is now cached, so assembly does not call TSFC.
+    before = tsfc_interface.cache_stats()
+    assemble(a)
+    assemble(L)
+    after = tsfc_interface.cache_stats()
+    assert after["compilations"] == before["compilations"]
+    assert after["misses"] == before["misses"]
+
+
+def test_precompile_problem(V):
+    u = Function(V)
+    v = TestFunction(V)
+    F = (inner(grad(u), grad(v)) + u**3*v - v) * dx
+    problem = NonlinearVariationalProblem(F, u, bcs=DirichletBC(V, 0, 1))
+
+    # Residual and Jacobian
+    assert precompile(forms=[problem]) == 2
+    # Each kernel is only counted once
+    assert precompile(forms=[problem, problem.F]) == 2
+
+
+def test_precompile_interpolation_and_point_evaluation(V):
+    x, y = SpatialCoordinate(V.mesh())
+    f = Function(V)
+    W = V*V
+    g = Function(W)
+
+    # One interpolation, the two locators and two evaluation kernels,
+    # which the components of g share with f
+    assert precompile(interpolations=[(x*y + 3, V)],
+                      point_evaluations=[f, g]) == 1 + 2 + 2
+    mesh = V.mesh()
+    assert None in mesh._c_reference_locator_cache
+    assert None in mesh._c_locator_cache
+    assert mesh.locate_cell([0.5, 0.5]) is not None
+
+    f.interpolate(x*y + 3)
+    assert np.allclose(f.at([0.5, 0.5]), 3.25)
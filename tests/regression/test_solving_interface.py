@@ -1,6 +1,7 @@
 import pytest
 from firedrake import *
 from firedrake.petsc import PETSc
+import numpy as np
 from numpy.linalg import norm as np_norm
 import gc
 
@@ -189,3 +190,34 @@ def test_constant_jacobian_lvs():
     lvs.solve()
 
     assert not (norm(assemble(out*5 - f)) < 2e-7)
+
+
+@pytest.mark.parametrize("params", [{"snes_linesearch_type": "basic"},
+                                    {"snes_linesearch_type": "bt"},
+                                    {"snes_linesearch_type": "basic",
+                                     "snes_lag_jacobian": 2}],
+                         ids=["basic", "bt", "lagged"])
+def test_fused_assembly(params):
+    mesh = UnitSquareMesh(4, 4)
+    V = FunctionSpace(mesh, "CG", 1)
+    x, y = SpatialCoordinate(mesh)
+    v = TestFunction(V)
+    solutions = []
+    jacobians = []
+    for fused in [False, True]:
+        u = Function(V)
+        F = (inner((1 + u**2)*grad(u), grad(v)) - x*y*v)*dx
+        problem = NonlinearVariationalProblem(F, u, bcs=DirichletBC(V, 0, "on_boundary"))
+        count = []
+        solver = NonlinearVariationalSolver(problem, fused_assembly=fused,
+                                            post_jacobian_callback=lambda X, J: count.append(1),
+                                            solver_parameters=dict(params,
+                                                                   snes_rtol=1e-10,
+                                                                   ksp_type="preonly",
+                                                                   pc_type="lu"))
+        solver.solve()
+        solutions.append(u)
+        jacobians.append((len(count), solver.snes.getIterationNumber()))
+
+    assert np.allclose(solutions[0].dat.data_ro, solutions[1].dat.data_ro)
+    assert jacobians[0] == jacobians[1]
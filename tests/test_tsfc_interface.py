@@ -1,4 +1,5 @@
 import pytest
+import numpy as np
 from firedrake import *
 import os
 import subprocess
@@ -89,6 +90,48 @@ with open("{file}", "w") as f:
         assert tsfc_interface.TSFCKernel._read_from_disk(
             cache_key, COMM_WORLD).cache_key == cache_key
 
+    def test_tsfc_cache_load(self, cache_key):
+        """Loading a kernel from disk should keep it in memory."""
+        tsfc_interface.TSFCKernel._cache.pop(cache_key, None)
+        assert tsfc_interface.TSFCKernel._load(cache_key, COMM_WORLD)
+        assert cache_key in tsfc_interface.TSFCKernel._cache
+        assert not tsfc_interface.TSFCKernel._load("0" * 32, COMM_WORLD)
+
+    def test_tsfc_cache_node_local(self, cache_key):
+        """Node-local reads should find the same kernels."""
+        old = parameters["node_local_kernel_cache"]
+        parameters["node_local_kernel_cache"] = True
+        try:
+            assert tsfc_interface.TSFCKernel._read_from_disk(
+                cache_key, COMM_WORLD).cache_key == cache_key
+        finally:
+            parameters["node_local_kernel_cache"] = old
+
+    def test_tsfc_cache_stats(self, mass):
+        """Cache lookups should be counted."""
+        def lookups(stats):
+            return stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+
+        before = tsfc_interface.cache_stats()
+        tsfc_interface.TSFCKernel(mass, 'mass', parameters["form_compiler"], {}, None)
+        after = tsfc_interface.cache_stats()
+        assert lookups(after) == lookups(before) + 1
+
+    def test_tsfc_cache_prune(self, cache_key):
+        """Pruning the disk cache should evict kernels."""
+        shard, key = cache_key[:2], cache_key[2:]
+        filepath = os.path.join(tsfc_interface.TSFCKernel._cachedir, shard, key)
+        size = os.path.getsize(filepath)
+        nkernels, total = tsfc_interface.cache_usage()
+        assert nkernels > 0 and total >= size
+
+        tsfc_interface.prune_cache(total - 1)
+        assert tsfc_interface.cache_usage()[1] <= total - 1
+
+        tsfc_interface.prune_cache(0)
+        assert tsfc_interface.cache_usage() == (0, 0)
+        assert not os.path.exists(filepath)
+
     def test_tsfc_same_form(self, mass):
         """Compiling the same form twice should load kernels from cache."""
         k1 = tsfc_interface.compile_form(mass, 'mass')
@@ -119,6 +162,40 @@ with open("{file}", "w") as f:
 
         assert k1[-1] is not k2[-1]
 
+    def test_tsfc_concurrent_compilation(self, fs):
+        """Compiling split blocks concurrently should give the same kernels."""
+        u, r = TrialFunctions(fs*fs)
+        v, s = TestFunctions(fs*fs)
+        form = (inner(grad(u), grad(v)) + u*s + r*v + 2*r*s) * dx
+        old = parameters["form_compiler_processes"]
+        parameters["form_compiler_processes"] = 2
+        try:
+            k1 = tsfc_interface.compile_form(form, 'concurrent')
+        finally:
+            parameters["form_compiler_processes"] = old
+        k2 = tsfc_interface.compile_form(form, 'serial')
+
+        assert len(k1) == len(k2) == 4
+        assert [k.indices for k in k1] == [k.indices for k in k2]
+        assert [k.kinfo.integral_type for k in k1] == [k.kinfo.integral_type for k in k2]
+
+    def test_tsfc_coffee_parameters_reuse_tsfc_output(self, fs):
+        """Changing only the COFFEE parameters should not call TSFC again."""
+        u = TrialFunction(fs)
+        v = TestFunction(fs)
+        form = (u*v + 3*inner(grad(u), grad(v))) * dx
+        tsfc_interface.compile_form(form, 'coffee_params')
+
+        before = tsfc_interface.cache_stats()
+        old = parameters["coffee"]["optlevel"]
+        parameters["coffee"]["optlevel"] = "O0" if old != "O0" else "Ov"
+        try:
+            tsfc_interface.compile_form(form, 'coffee_params')
+        finally:
+            parameters["coffee"]["optlevel"] = old
+        after = tsfc_interface.cache_stats()
+        assert after["compilations"] == before["compilations"]
+
     def test_tsfc_cell_kernel(self, mass):
         k = tsfc_interface.compile_form(mass, 'mass')
         assert len(k) == 1 and 'cell_integral' in loopy.generate_code_v2(k[0][1][0].code).device_code()
@@ -132,3 +209,21 @@ with open("{file}", "w") as f:
         kernel_name = sorted(k_[1][0].name for k_ in k)
         assert len(k) == 2 and 'cell_integral' in kernel_name[0] and \
             'exterior_facet_integral' in kernel_name[1]
+
+
+@pytest.mark.parallel(nprocs=2)
+def test_tsfc_node_local_cache_parallel():
+    old = parameters["node_local_kernel_cache"]
+    parameters["node_local_kernel_cache"] = True
+    try:
+        mesh = UnitSquareMesh(4, 4)
+        V = FunctionSpace(mesh, "CG", 1)
+        u = TrialFunction(V)
+        v = TestFunction(V)
+        c = Constant(3.0)
+        k1 = tsfc_interface.compile_form(c*u*v*dx, "node_local")
+        k2 = tsfc_interface.compile_form(c*u*v*dx, "node_local")
+        assert len(k1) == len(k2) == 1
+        assert np.isclose(assemble(c*dx(domain=mesh)), 3.0)
+    finally:
+        parameters["node_local_kernel_cache"] = old